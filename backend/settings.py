@@ -145,6 +145,47 @@ MODEL_NAME = os.getenv('MODEL', 'roshanai/roshan')
 TEMPERATURE = float(os.getenv('TEMPERATURE', '0.7'))
 BASE_URL = os.getenv('BASE_URL', 'https://llm.roshan-ai.ir/v1')
 
+# Scan execution: 'inline' runs scans inside the web request, 'queue' only
+# enqueues them for `manage.py scan_worker` processes on any node.
+SCAN_EXECUTION = os.getenv('SCAN_EXECUTION', 'inline')
+SCAN_LEASE_SECONDS = int(os.getenv('SCAN_LEASE_SECONDS', '60'))
+SCAN_JOB_MAX_ATTEMPTS = int(os.getenv('SCAN_JOB_MAX_ATTEMPTS', '3'))
+# Inline requests wait for the scheduler too: at most SCAN_INLINE_CONCURRENCY
+# scans run at once, and a request whose job is not picked within
+# SCAN_INLINE_WAIT_SECONDS gives up with 429.
+SCAN_INLINE_CONCURRENCY = int(os.getenv('SCAN_INLINE_CONCURRENCY', '4'))
+SCAN_INLINE_WAIT_SECONDS = int(os.getenv('SCAN_INLINE_WAIT_SECONDS', '600'))
+
+# Scheduling (see chat/scheduler.py). A job's wait is worth one priority class
+# per SCHEDULER_PRIORITY_STEP_SECONDS; every job its owner already has running
+# pushes it back SCHEDULER_FAIR_SHARE_PENALTY_SECONDS. Submissions beyond the
+# queue limits get 429 with Retry-After.
+SCHEDULER_PRIORITY_STEP_SECONDS = int(os.getenv('SCHEDULER_PRIORITY_STEP_SECONDS', '300'))
+SCHEDULER_FAIR_SHARE_PENALTY_SECONDS = int(os.getenv('SCHEDULER_FAIR_SHARE_PENALTY_SECONDS', '120'))
+SCHEDULER_MAX_QUEUED = int(os.getenv('SCHEDULER_MAX_QUEUED', '200'))
+SCHEDULER_MAX_PENDING_PER_OWNER = int(os.getenv('SCHEDULER_MAX_PENDING_PER_OWNER', '20'))
+# Jobs are accounted to the X-Api-Key header only for keys listed here
+# (comma-separated); any other key is ignored and the session or client IP is
+# used instead.
+SCHEDULER_API_KEYS = [key.strip() for key in os.getenv('SCHEDULER_API_KEYS', '').split(',') if key.strip()]
+
+# Full-text search over findings and reports (see chat/search.py).
+# Use 'chat.search.DatabaseSearchBackend' on databases without SQLite FTS5.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'chat.search.SQLiteFTSBackend')
+# Search and exports span every session: only staff users and clients sending
+# an X-Api-Key listed here (comma-separated) may use them.
+DATA_API_KEYS = [key.strip() for key in os.getenv('DATA_API_KEYS', '').split(',') if key.strip()]
+
+# Retention (`manage.py apply_retention`): raw scan output older than
+# RETENTION_RAW_OUTPUT_DAYS is moved to compressed files, sessions idle for
+# RETENTION_SESSION_DAYS are deleted. 0 disables a rule.
+RETENTION_RAW_OUTPUT_DAYS = int(os.getenv('RETENTION_RAW_OUTPUT_DAYS', '30'))
+RETENTION_SESSION_DAYS = int(os.getenv('RETENTION_SESSION_DAYS', '180'))
+RETENTION_ARCHIVE_DIR = Path(os.getenv('RETENTION_ARCHIVE_DIR', BASE_DIR / 'archive'))
+# 'gzip' or 'zstd' (needs the optional zstandard package)
+RETENTION_COMPRESSION = os.getenv('RETENTION_COMPRESSION', 'gzip')
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '100'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
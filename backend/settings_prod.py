@@ -0,0 +1,72 @@
+"""
+Production settings for backend project.
+
+Use with DJANGO_SETTINGS_MODULE=backend.settings_prod behind gunicorn
+(see gunicorn.conf.py). Everything not overridden here comes from settings.py.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .database import database_config
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE
+
+DEBUG = False
+
+SECRET_KEY = os.getenv('SECRET_KEY', '')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Set the SECRET_KEY environment variable for production.')
+
+ALLOWED_HOSTS = [host.strip() for host in os.getenv('ALLOWED_HOSTS', '*').split(',') if host.strip()]
+
+# Set HTTPS=1 when served over TLS (directly or behind a proxy sending X-Forwarded-Proto).
+if os.getenv('HTTPS', '') == '1':
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+    SESSION_COOKIE_SECURE = True
+    CSRF_COOKIE_SECURE = True
+
+
+# Database
+# SQLite runs in WAL mode with a busy timeout and persistent connections;
+# set DATABASE_URL=postgres://... to move to Postgres.
+
+DATABASES = {
+    'default': database_config(
+        os.getenv('DATABASE_URL', f'sqlite:///{BASE_DIR / "db.sqlite3"}'),
+        conn_max_age=int(os.getenv('CONN_MAX_AGE', '600')),
+    )
+}
+
+if DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+    # The FTS5 index only exists on SQLite.
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'chat.search.DatabaseSearchBackend')
+
+
+# Static files (the admin's CSS and JS) are collected into STATIC_ROOT when the
+# container starts and served by WhiteNoise from the gunicorn workers.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+MIDDLEWARE = list(MIDDLEWARE)
+MIDDLEWARE.insert(
+    MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+)
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.getenv('LOG_LEVEL', 'INFO'),
+    },
+}
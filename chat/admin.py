@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import ChatMessage, ChatSession
+from .models import ChatMessage, ChatSession, Finding, ScanJob, ScanWorker
+from .search import FINDING, REPORT, get_search_backend
 
 
 @admin.register(ChatSession)
@@ -16,3 +17,39 @@ class ChatMessageAdmin(admin.ModelAdmin):
     list_filter = ("role",)
     search_fields = ("content",)
     ordering = ("-created_at",)
+
+    def get_search_results(self, request, queryset, search_term):
+        # LIKE over multi-megabyte scan dumps is too slow; go through the search
+        # index and match scan messages through the findings extracted from them.
+        if not search_term:
+            return queryset, False
+        hits = get_search_backend().search(search_term, limit=500)
+        message_ids = {hit["id"] for hit in hits if hit["type"] == REPORT}
+        finding_ids = [hit["id"] for hit in hits if hit["type"] == FINDING]
+        message_ids.update(
+            Finding.objects.filter(id__in=finding_ids, message__isnull=False).values_list("message_id", flat=True)
+        )
+        return queryset.filter(id__in=message_ids), False
+
+
+@admin.register(Finding)
+class FindingAdmin(admin.ModelAdmin):
+    list_display = ("id", "host", "tool", "severity", "title", "created_at")
+    list_filter = ("tool", "severity")
+    search_fields = ("host", "title")
+    ordering = ("-created_at",)
+
+
+@admin.register(ScanJob)
+class ScanJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "url", "profile", "priority", "status", "lease_owner", "attempts", "created_at")
+    list_filter = ("status", "priority", "profile")
+    search_fields = ("id", "url")
+    ordering = ("-created_at",)
+
+
+@admin.register(ScanWorker)
+class ScanWorkerAdmin(admin.ModelAdmin):
+    list_display = ("name", "hostname", "pid", "capabilities", "last_heartbeat")
+    search_fields = ("name", "hostname")
+    ordering = ("name",)
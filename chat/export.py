@@ -0,0 +1,157 @@
+"""
+Streaming export of findings and LLM reports as NDJSON or SARIF 2.1.0.
+
+Rows are read with QuerySet.iterator() (a server-side cursor on Postgres,
+chunked fetches on SQLite) and encoded one at a time, so memory use does not
+depend on how much is exported.
+"""
+import json
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from django.db.models import QuerySet
+
+from .models import ChatMessage, Finding
+
+CHUNK_SIZE = 500
+# Encoded output is handed out in pieces of about this many characters.
+BUFFER_SIZE = 64 * 1024
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sarif": "application/sarif+json",
+}
+
+FINDING_FIELDS = ("id", "session_id", "host", "tool", "severity", "title", "location", "detail", "created_at")
+REPORT_FIELDS = ("id", "session_id", "target", "host", "content", "created_at")
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_LEVELS = {
+    Finding.Severity.CRITICAL: "error",
+    Finding.Severity.HIGH: "error",
+    Finding.Severity.MEDIUM: "warning",
+}
+REPORT_TOOL_NAME = "AMN Bot analysis"
+
+
+def export_querysets(
+    host: Optional[str] = None,
+    session_id=None,
+    since=None,
+    until=None,
+) -> Tuple[QuerySet, QuerySet]:
+    """Findings and reports matching the export filters."""
+    findings = Finding.objects.all()
+    reports = ChatMessage.objects.filter(role=ChatMessage.Role.ASSISTANT)
+    if host:
+        findings = findings.filter(host=host)
+        reports = reports.filter(host=host)
+    if session_id:
+        findings = findings.filter(session_id=session_id)
+        reports = reports.filter(session_id=session_id)
+    if since:
+        findings = findings.filter(created_at__gte=since)
+        reports = reports.filter(created_at__gte=since)
+    if until:
+        findings = findings.filter(created_at__lt=until)
+        reports = reports.filter(created_at__lt=until)
+    return findings, reports
+
+
+def _rows(queryset: QuerySet, fields: Iterable[str], *ordering: str) -> Iterator[Dict[str, Any]]:
+    for row in queryset.order_by(*ordering).values(*fields).iterator(chunk_size=CHUNK_SIZE):
+        row["session_id"] = str(row["session_id"])
+        row["created_at"] = row["created_at"].isoformat()
+        yield row
+
+
+def _buffered(pieces: Iterable[str]) -> Iterator[str]:
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _ndjson(findings: QuerySet, reports: QuerySet) -> Iterator[str]:
+    for row in _rows(findings, FINDING_FIELDS, "id"):
+        yield json.dumps({"type": "finding", **row}, ensure_ascii=False) + "\n"
+    for row in _rows(reports, REPORT_FIELDS, "id"):
+        yield json.dumps({"type": "report", **row}, ensure_ascii=False) + "\n"
+
+
+def _sarif_result(row: Dict[str, Any]) -> Dict[str, Any]:
+    message = row["title"] if not row["detail"] else f"{row['title']}\n{row['detail']}"
+    return {
+        "ruleId": row["title"][:255],
+        "level": SARIF_LEVELS.get(row["severity"], "note"),
+        "message": {"text": message},
+        "locations": [
+            {"physicalLocation": {"artifactLocation": {"uri": row["location"] or row["host"]}}}
+        ],
+        "properties": {
+            "findingId": row["id"],
+            "sessionId": row["session_id"],
+            "host": row["host"],
+            "severity": row["severity"],
+            "createdAt": row["created_at"],
+        },
+    }
+
+
+def _sarif_report_result(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ruleId": "analysis",
+        "level": "note",
+        "message": {"text": row["content"]},
+        "locations": [
+            {"physicalLocation": {"artifactLocation": {"uri": row["target"] or "unknown"}}}
+        ],
+        "properties": {
+            "reportId": row["id"],
+            "sessionId": row["session_id"],
+            "host": row["host"],
+            "createdAt": row["created_at"],
+        },
+    }
+
+
+def _sarif(findings: QuerySet, reports: QuerySet) -> Iterator[str]:
+    """
+    Write the SARIF document by hand around the streamed results: one run per
+    tool (findings are read ordered by tool), plus one run for the reports.
+    """
+    def run_header(name):
+        return '{"tool": {"driver": {"name": %s}}, "results": [' % json.dumps(name)
+
+    yield '{"$schema": %s, "version": "2.1.0", "runs": [' % json.dumps(SARIF_SCHEMA)
+    current_tool = None
+    for row in _rows(findings, FINDING_FIELDS, "tool", "id"):
+        if row["tool"] != current_tool:
+            yield ("]}, " if current_tool is not None else "") + run_header(row["tool"])
+            current_tool = row["tool"]
+        else:
+            yield ", "
+        yield json.dumps(_sarif_result(row), ensure_ascii=False)
+
+    first_report = True
+    for row in _rows(reports, REPORT_FIELDS, "id"):
+        if first_report:
+            yield ("]}, " if current_tool is not None else "") + run_header(REPORT_TOOL_NAME)
+            current_tool = REPORT_TOOL_NAME
+            first_report = False
+        else:
+            yield ", "
+        yield json.dumps(_sarif_report_result(row), ensure_ascii=False)
+
+    yield ("]}" if current_tool is not None else "") + "]}\n"
+
+
+def stream_export(export_format: str, **filters) -> Iterator[str]:
+    """Yield the export in chunks; filters are those of export_querysets."""
+    findings, reports = export_querysets(**filters)
+    encoder = _ndjson if export_format == "ndjson" else _sarif
+    return _buffered(encoder(findings, reports))
@@ -0,0 +1,173 @@
+"""
+Normalize the per-tool script results into Finding rows.
+Raw output stays in the scan message; findings are the small, structured
+part that search, exports and retention keep around.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from django.db import transaction
+
+from .models import ChatMessage, ChatSession, Finding
+from .retention import load_archived_content
+from .url_scripts import NMAP_OPEN_PORT_RE, extract_host
+
+NIKTO_ITEM_RE = re.compile(r"^\+ (/\S*): (.+)$")  # Match: + /admin/: Admin login page found.
+NIKTO_SERVER_RE = re.compile(r"^\+ Server: (.+)$")
+
+KNOWN_SEVERITIES = set(Finding.Severity.values)
+
+# Scan messages carry the script results as JSON after this marker.
+SCRIPT_RESULTS_MARKER = "\n\nScript Results:\n"
+
+
+def _nmap_findings(result: Dict[str, Any], host: str) -> List[Dict[str, Any]]:
+    findings = []
+    for line in (result.get("script_output") or "").splitlines():
+        match = NMAP_OPEN_PORT_RE.match(line.strip())
+        if match:
+            port, protocol, service = match.groups()
+            findings.append({
+                "title": f"{port}/{protocol} open {service}",
+                "location": f"{host}:{port}",
+            })
+    return findings
+
+
+def _dirsearch_findings(result: Dict[str, Any], host: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            "title": f"{item['status']} {item['path']}",
+            "location": item["url"],
+        }
+        for item in result.get("results", [])
+    ]
+
+
+def _nikto_findings(result: Dict[str, Any], host: str) -> List[Dict[str, Any]]:
+    findings = []
+    for line in (result.get("script_output") or "").splitlines():
+        line = line.strip()
+        item = NIKTO_ITEM_RE.match(line)
+        if item:
+            findings.append({"title": item.group(2)[:512], "location": item.group(1)})
+            continue
+        server = NIKTO_SERVER_RE.match(line)
+        if server:
+            findings.append({"title": f"Server: {server.group(1)}"[:512]})
+    return findings
+
+
+def _nuclei_findings(result: Dict[str, Any], host: str) -> List[Dict[str, Any]]:
+    findings = []
+    for item in result.get("results", []):
+        severity = item.get("severity") or Finding.Severity.UNKNOWN
+        findings.append({
+            "title": (item.get("name") or item.get("template_id") or "nuclei match")[:512],
+            "severity": severity if severity in KNOWN_SEVERITIES else Finding.Severity.UNKNOWN,
+            "location": item.get("matched_at") or "",
+            "detail": " ".join(
+                [item.get("template_id") or ""]
+                + list(item.get("tags") or [])
+                + [str(value) for value in item.get("extracted_results") or []]
+            ).strip(),
+        })
+    return findings
+
+
+def _whatweb_findings(result: Dict[str, Any], host: str) -> List[Dict[str, Any]]:
+    output = (result.get("script_output") or "").strip()
+    if not output or output.startswith("[ERROR]"):
+        return []
+    return [{"title": "Technology fingerprint", "detail": output}]
+
+
+# script_name prefix -> (tool, extractor)
+EXTRACTORS = [
+    ("nmap", _nmap_findings),
+    ("dirsearch", _dirsearch_findings),
+    ("nikto", _nikto_findings),
+    ("nuclei", _nuclei_findings),
+    ("whatweb", _whatweb_findings),
+]
+
+
+def extract_findings(script_results: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turn the output of process_url_with_scripts into Finding field dicts."""
+    host = extract_host(script_results.get("url", ""))
+    findings = []
+    for result in script_results.get("results", []):
+        script_name = result.get("script_name", "")
+        for tool, extractor in EXTRACTORS:
+            if script_name.startswith(tool):
+                for finding in extractor(result, host):
+                    finding.setdefault("severity", Finding.Severity.INFO)
+                    findings.append({"host": host, "tool": tool, **finding})
+                break
+    return findings
+
+
+def save_findings(session: ChatSession, message: ChatMessage, script_results: Dict[str, Any]) -> List[Finding]:
+    # Saved one by one so post_save keeps the search index in step.
+    with transaction.atomic():
+        return [
+            Finding.objects.create(session=session, message=message, **fields)
+            for fields in extract_findings(script_results)
+        ]
+
+
+def _stored_script_results(message: ChatMessage) -> Optional[Dict[str, Any]]:
+    _, marker, payload = load_archived_content(message).partition(SCRIPT_RESULTS_MARKER)
+    if not marker:
+        return None
+    try:
+        script_results = json.loads(payload)
+    except ValueError:
+        return None
+    if not isinstance(script_results, dict) or not isinstance(script_results.get("url"), str):
+        return None
+    return script_results
+
+
+def backfill_findings(batch_size: int = 100) -> int:
+    """
+    Extract findings from scan messages stored before findings existed, and set
+    target and host on them and on the analysis that answered them.
+    Returns the number of scan messages backfilled.
+    """
+    pending = ChatMessage.objects.filter(
+        role=ChatMessage.Role.USER, target="", findings__isnull=True
+    ).order_by("id")
+    backfilled = 0
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for message in batch:
+            script_results = _stored_script_results(message)
+            if script_results is None:
+                continue
+            url = script_results["url"]
+            host = extract_host(url)
+            with transaction.atomic():
+                ChatMessage.objects.filter(id=message.id).update(target=url, host=host)
+                save_findings(message.session, message, script_results)
+                answer = (
+                    ChatMessage.objects.filter(
+                        session_id=message.session_id,
+                        role=ChatMessage.Role.ASSISTANT,
+                        target="",
+                        id__gt=message.id,
+                    )
+                    .order_by("id")
+                    .first()
+                )
+                if answer is not None:
+                    # save() rather than update() so the search index picks up the host.
+                    answer.target, answer.host = url, host
+                    answer.save(update_fields=["target", "host"])
+            backfilled += 1
+    return backfilled
@@ -0,0 +1,294 @@
+"""
+Lease-based scan job queue stored in the shared database.
+
+Workers claim a job by atomically moving it to RUNNING with their name and a
+lease expiry, then keep the lease alive with heartbeats while the scan runs.
+A job whose lease expired (the worker died or lost the network) is claimable
+again, so any node can pick it up.
+"""
+import logging
+import shutil
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ChatMessage, ChatSession, ScanJob
+from .pipeline import run_scan
+from .scheduler import QueueFull, order_candidates, priority_for, retry_after, running_per_owner
+from .url_scripts import REQUIRED_BINARIES, required_binaries
+
+logger = logging.getLogger(__name__)
+
+# How many jobs a worker considers per claim attempt: this many of the highest
+# priority plus this many of the oldest, so aged low-priority jobs are seen too.
+CLAIM_WINDOW = 100
+
+# A heartbeat that fails with a database error (e.g. "database is locked") is
+# retried this many times, HEARTBEAT_RETRY_SECONDS apart, before the lease is
+# given up as lost.
+HEARTBEAT_ATTEMPTS = 3
+HEARTBEAT_RETRY_SECONDS = 2
+
+# How often a request running its scan inline checks whether it is its turn.
+# Each check stamps heartbeat_at on its queued job; a queued job whose stamp
+# is older than INLINE_WAITER_TIMEOUT_SECONDS lost its request (the web
+# worker was killed or recycled) and is failed so it stops holding a slot.
+INLINE_POLL_SECONDS = 1.0
+INLINE_WAITER_TIMEOUT_SECONDS = 30
+
+
+class LeaseLost(Exception):
+    """Another worker took the job over; its results must not be stored."""
+
+
+def detect_capabilities() -> List[str]:
+    """Return the scanner binaries installed on this node."""
+    return [binary for binary in REQUIRED_BINARIES if shutil.which(binary)]
+
+
+def enqueue_scan(
+    session: ChatSession,
+    url: str,
+    profile: str,
+    priority: Optional[int] = None,
+    owner_key: str = "",
+) -> ScanJob:
+    owner_key = owner_key or f"session:{session.id}"
+    return ScanJob.objects.create(
+        session=session,
+        url=url,
+        profile=profile,
+        priority=priority_for(profile, priority, owner_key),
+        owner_key=owner_key,
+        required_capabilities=required_binaries(profile),
+    )
+
+
+def _claimable(now) -> Q:
+    return Q(status=ScanJob.Status.QUEUED) | Q(
+        status=ScanJob.Status.RUNNING, lease_expires_at__lt=now
+    )
+
+
+def fail_exhausted_jobs() -> int:
+    """Give up on jobs whose lease expired on their last allowed attempt."""
+    now = timezone.now()
+    return ScanJob.objects.filter(
+        status=ScanJob.Status.RUNNING,
+        lease_expires_at__lt=now,
+        attempts__gte=settings.SCAN_JOB_MAX_ATTEMPTS,
+    ).update(
+        status=ScanJob.Status.FAILED,
+        error="Lease expired too many times.",
+        finished_at=now,
+    )
+
+
+def _ranked_candidates(now, running: Dict[str, int]) -> List[ScanJob]:
+    claimable = ScanJob.objects.filter(_claimable(now))
+    window = {job.id: job for job in claimable.order_by("priority", "created_at")[:CLAIM_WINDOW]}
+    window.update((job.id, job) for job in claimable.order_by("created_at")[:CLAIM_WINDOW])
+    return order_candidates(window.values(), running, now)
+
+
+def claim_job(
+    worker_name: str,
+    capabilities: Optional[Iterable[str]] = None,
+    job_id=None,
+    lease_seconds: Optional[int] = None,
+) -> Optional[ScanJob]:
+    """
+    Claim the job the scheduler ranks first among those this worker can run,
+    or the given job.
+
+    The claim is a conditional UPDATE, so when several workers race for the
+    same row exactly one of them wins; losers move on to the next candidate.
+    """
+    lease_seconds = lease_seconds or settings.SCAN_LEASE_SECONDS
+    fail_exhausted_jobs()
+
+    now = timezone.now()
+    if job_id is not None:
+        candidates = list(ScanJob.objects.filter(_claimable(now), id=job_id))
+    else:
+        candidates = _ranked_candidates(now, running_per_owner(now))
+    available = set(capabilities) if capabilities is not None else None
+
+    for job in candidates:
+        if available is not None and not set(job.required_capabilities) <= available:
+            continue
+        claimed = ScanJob.objects.filter(_claimable(now), id=job.id).update(
+            status=ScanJob.Status.RUNNING,
+            lease_owner=worker_name,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            heartbeat_at=now,
+            started_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def fail_abandoned_inline_jobs() -> int:
+    """Fail queued jobs whose inline request stopped waiting for them."""
+    now = timezone.now()
+    return ScanJob.objects.filter(
+        status=ScanJob.Status.QUEUED,
+        heartbeat_at__lt=now - timedelta(seconds=INLINE_WAITER_TIMEOUT_SECONDS),
+    ).update(
+        status=ScanJob.Status.FAILED,
+        error="The request waiting for this scan went away.",
+        finished_at=now,
+    )
+
+
+def claim_when_scheduled(
+    job: ScanJob,
+    worker_name: str,
+    slots: Optional[int] = None,
+    wait_seconds: Optional[int] = None,
+) -> Optional[ScanJob]:
+    """
+    Wait until fewer than `slots` scans are running and the scheduler ranks
+    this job among the next ones to start, then claim it. Used by requests
+    that run their scan inline, so they obey priorities, fair share and aging
+    like the workers do.
+
+    Returns None if a worker claimed the job meanwhile. Raises QueueFull,
+    failing the job, when its turn has not come within wait_seconds.
+    """
+    slots = slots or settings.SCAN_INLINE_CONCURRENCY
+    wait_seconds = settings.SCAN_INLINE_WAIT_SECONDS if wait_seconds is None else wait_seconds
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        now = timezone.now()
+        if not ScanJob.objects.filter(id=job.id, status=ScanJob.Status.QUEUED).update(heartbeat_at=now):
+            return None
+        fail_abandoned_inline_jobs()
+        running = running_per_owner(now)
+        free_slots = slots - sum(running.values())
+        if free_slots > 0:
+            next_ids = [candidate.id for candidate in _ranked_candidates(now, running)[:free_slots]]
+            if job.id in next_ids:
+                claimed = claim_job(worker_name, job_id=job.id)
+                if claimed is not None:
+                    return claimed
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(INLINE_POLL_SECONDS)
+
+    queued = ScanJob.objects.filter(status=ScanJob.Status.QUEUED).count()
+    if not ScanJob.objects.filter(id=job.id, status=ScanJob.Status.QUEUED).update(
+        status=ScanJob.Status.FAILED,
+        error="No scan slot became free in time.",
+        finished_at=timezone.now(),
+    ):
+        return None
+    raise QueueFull("No scan slot became free in time.", retry_after(queued))
+
+
+def heartbeat(job: ScanJob, worker_name: str, lease_seconds: Optional[int] = None) -> bool:
+    """Extend the lease on a job; False means another worker took it over."""
+    lease_seconds = lease_seconds or settings.SCAN_LEASE_SECONDS
+    now = timezone.now()
+    return bool(
+        ScanJob.objects.filter(
+            id=job.id, status=ScanJob.Status.RUNNING, lease_owner=worker_name
+        ).update(
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            heartbeat_at=now,
+        )
+    )
+
+
+def _finish(job: ScanJob, worker_name: str, **fields) -> bool:
+    # Only the current lease holder may record the outcome.
+    return bool(
+        ScanJob.objects.filter(
+            id=job.id, status=ScanJob.Status.RUNNING, lease_owner=worker_name
+        ).update(finished_at=timezone.now(), lease_expires_at=None, **fields)
+    )
+
+
+class LeaseKeeper:
+    """Heartbeat a job lease from a background thread while it runs."""
+
+    def __init__(self, job: ScanJob, worker_name: str, lease_seconds: Optional[int] = None):
+        self.job = job
+        self.worker_name = worker_name
+        self.lease_seconds = lease_seconds or settings.SCAN_LEASE_SECONDS
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                if not self._beat():
+                    logger.warning(f"Lost lease on {self.job} held by {self.worker_name}")
+                    self.lost.set()
+                    return
+        finally:
+            connection.close()
+
+    def _beat(self) -> bool:
+        for attempt in range(1, HEARTBEAT_ATTEMPTS + 1):
+            try:
+                return heartbeat(self.job, self.worker_name, self.lease_seconds)
+            except DatabaseError as exc:
+                logger.warning(f"Heartbeat {attempt} for {self.job} failed: {exc}")
+                if self._stop.wait(HEARTBEAT_RETRY_SECONDS):
+                    return True
+        return False
+
+    def complete(self, assistant_message: ChatMessage) -> None:
+        """
+        Mark the job done, as part of the transaction storing its results.
+        Raises LeaseLost, rolling that transaction back, unless this worker
+        still holds the job.
+        """
+        if not self.lost.is_set() and _finish(
+            self.job, self.worker_name, status=ScanJob.Status.DONE, assistant_message=assistant_message
+        ):
+            return
+        self.lost.set()
+        raise LeaseLost(f"Lease on {self.job} is no longer held by {self.worker_name}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def execute_job(
+    job: ScanJob, worker_name: str, lease_seconds: Optional[int] = None
+) -> Tuple[Dict[str, Any], ChatMessage]:
+    """
+    Run a claimed job under its lease and record the outcome.
+    Returns the script results and the analysis; errors are recorded on the
+    job and re-raised. Raises LeaseLost, storing nothing, when another worker
+    took the job over during the scan.
+    """
+    try:
+        with LeaseKeeper(job, worker_name, lease_seconds) as keeper:
+            script_results, assistant_message = run_scan(
+                job.session, job.url, job.profile, before_commit=keeper.complete
+            )
+    except LeaseLost:
+        logger.warning(f"Lease on {job} was lost during the scan; its new owner records the outcome")
+        raise
+    except Exception as exc:
+        _finish(job, worker_name, status=ScanJob.Status.FAILED, error=str(exc))
+        raise
+    return script_results, assistant_message
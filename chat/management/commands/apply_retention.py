@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive old raw scan output, delete expired sessions and vacuum the database. "
+        "Run it from cron, or keep it running with --every."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--raw-output-days", type=int, help="Override RETENTION_RAW_OUTPUT_DAYS (0 = keep).")
+        parser.add_argument("--session-days", type=int, help="Override RETENTION_SESSION_DAYS (0 = keep).")
+        parser.add_argument("--batch-size", type=int, help="Override RETENTION_BATCH_SIZE.")
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.2,
+            help="Seconds to sleep between batches so other writers get the lock.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be done.")
+        parser.add_argument("--no-vacuum", action="store_true")
+        parser.add_argument(
+            "--full-vacuum",
+            action="store_true",
+            help="Switch SQLite to incremental auto_vacuum with one full VACUUM (locks the database).",
+        )
+        parser.add_argument("--every", type=int, default=0, help="Repeat every N seconds instead of exiting.")
+
+    def handle(self, *args, **options):
+        full_vacuum = options["full_vacuum"]
+        while True:
+            summary = apply_retention(
+                raw_output_days=options["raw_output_days"],
+                session_days=options["session_days"],
+                batch_size=options["batch_size"],
+                pause=options["pause"],
+                dry_run=options["dry_run"],
+                run_vacuum=not options["no_vacuum"],
+                full_vacuum=full_vacuum,
+            )
+            prefix = "Would have" if options["dry_run"] else "Retention"
+            self.stdout.write(
+                f"{prefix}: {summary['sessions_deleted']} session(s) deleted, "
+                f"{summary['messages_archived']} message(s) archived, "
+                f"{summary['pages_released'] or 0} page(s) released"
+            )
+            if not options["every"]:
+                break
+            # The full VACUUM only has to happen once.
+            full_vacuum = False
+            time.sleep(options["every"])
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from chat.export import FORMATS, stream_export
+
+
+def _datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError(f"Invalid date/time {value!r}; use ISO 8601.")
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+class Command(BaseCommand):
+    help = "Stream findings and LLM reports as NDJSON or SARIF, e.g. to feed a SIEM."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+        parser.add_argument("--output", default="-", help="File to write, '-' for stdout.")
+        parser.add_argument("--host")
+        parser.add_argument("--session", help="Only this session id.")
+        parser.add_argument("--since", type=_datetime, help="ISO 8601, inclusive.")
+        parser.add_argument("--until", type=_datetime, help="ISO 8601, exclusive.")
+
+    def handle(self, *args, **options):
+        chunks = stream_export(
+            options["format"],
+            host=options["host"],
+            session_id=options["session"],
+            since=options["since"],
+            until=options["until"],
+        )
+        if options["output"] == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+        with open(options["output"], "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(chunk)
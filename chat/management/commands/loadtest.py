@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from backend.database import SQLITE_BUSY_TIMEOUT, SQLITE_PRAGMAS
+
+# SQLite connection profiles compared by the database load test:
+# Django's defaults (rollback journal, deferred transactions, 5 s timeout)
+# against backend.settings_prod (WAL, BEGIN IMMEDIATE, longer busy timeout).
+SQLITE_PROFILES = {
+    "default": {"pragmas": [], "begin": "BEGIN", "timeout": 5},
+    "production": {"pragmas": SQLITE_PRAGMAS, "begin": "BEGIN IMMEDIATE", "timeout": SQLITE_BUSY_TIMEOUT},
+}
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrency. Without --url, replay the scan write pattern against a "
+        "scratch SQLite file with the default and the production connection settings. "
+        "With --url, send concurrent GET requests to a running server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Endpoint of a running server to load, e.g. http://localhost:8000/api/search/?q=nginx")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=400, help="Total HTTP requests (with --url).")
+        parser.add_argument("--writes", type=int, default=50, help="Transactions per writer thread (database test).")
+        parser.add_argument("--readers", type=int, default=4, help="Concurrent reader threads (database test).")
+        parser.add_argument("--payload-kb", type=int, default=64, help="Size of each written message (database test).")
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            self._http_test(options)
+        else:
+            for profile in SQLITE_PROFILES:
+                self._database_test(profile, options)
+
+    def _report(self, label, ok, errors, latencies, elapsed):
+        self.stdout.write(
+            f"{label:<12} ok={ok:<6} errors={errors:<5} "
+            f"throughput={ok / elapsed:8.1f}/s "
+            f"p50={statistics.median(latencies) * 1000 if latencies else 0:7.1f}ms "
+            f"p95={_percentile(latencies, 95) * 1000:7.1f}ms"
+        )
+
+    def _http_test(self, options):
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def hit(_):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                ok = requests.get(options["url"], timeout=60).status_code < 500
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            list(executor.map(hit, range(options["requests"])))
+        self._report("http", len(latencies), errors, latencies, time.perf_counter() - start)
+
+    def _database_test(self, profile_name, options):
+        profile = SQLITE_PROFILES[profile_name]
+        payload = "x" * (options["payload_kb"] * 1024)
+        latencies, errors = [], 0
+        lock = threading.Lock()
+        stop_readers = threading.Event()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "loadtest.sqlite3")
+
+            def connect():
+                conn = sqlite3.connect(path, timeout=profile["timeout"], isolation_level=None, check_same_thread=False)
+                for pragma in profile["pragmas"]:
+                    conn.execute(pragma)
+                return conn
+
+            setup = connect()
+            setup.execute("CREATE TABLE message (id INTEGER PRIMARY KEY, session INTEGER, content TEXT)")
+            setup.execute("CREATE INDEX message_session ON message (session)")
+            setup.close()
+
+            def writer(session):
+                # Same shape as a scan: read the session, then append to it.
+                nonlocal errors
+                conn = connect()
+                for _ in range(options["writes"]):
+                    start = time.perf_counter()
+                    try:
+                        conn.execute(profile["begin"])
+                        conn.execute("SELECT count(*) FROM message WHERE session = ?", [session]).fetchone()
+                        conn.execute("INSERT INTO message (session, content) VALUES (?, ?)", [session, payload])
+                        conn.execute("COMMIT")
+                        with lock:
+                            latencies.append(time.perf_counter() - start)
+                    except sqlite3.OperationalError:
+                        if conn.in_transaction:
+                            conn.execute("ROLLBACK")
+                        with lock:
+                            errors += 1
+                conn.close()
+
+            def reader():
+                conn = connect()
+                while not stop_readers.is_set():
+                    conn.execute("SELECT session, length(content) FROM message").fetchall()
+                conn.close()
+
+            readers = [threading.Thread(target=reader) for _ in range(options["readers"])]
+            for thread in readers:
+                thread.start()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                list(executor.map(writer, range(options["concurrency"])))
+            elapsed = time.perf_counter() - start
+            stop_readers.set()
+            for thread in readers:
+                thread.join()
+
+        self._report(profile_name, len(latencies), errors, latencies, elapsed)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from chat.findings import backfill_findings
+from chat.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index over findings and LLM reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="First extract findings, target and host from scan messages stored before findings existed.",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            backfilled = backfill_findings()
+            self.stdout.write(f"Backfilled {backfilled} scan message(s)")
+        indexed = get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} document(s)"))
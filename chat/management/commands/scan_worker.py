@@ -0,0 +1,103 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from chat.jobs import LeaseLost, claim_job, detect_capabilities, execute_job
+from chat.models import ScanWorker
+
+
+# Longest wait between retries while the database is unreachable or locked.
+MAX_BACKOFF_SECONDS = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Claim scan jobs from the shared database and run them. "
+        "Start one or more on every node that has scanner binaries installed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--name",
+            default=f"{socket.gethostname()}-{os.getpid()}",
+            help="Unique worker name used as the lease owner.",
+        )
+        parser.add_argument(
+            "--capability",
+            action="append",
+            dest="capabilities",
+            help="Advertise a capability instead of detecting installed binaries (repeatable).",
+        )
+        parser.add_argument("--poll-interval", type=float, default=2.0)
+        parser.add_argument("--lease-seconds", type=int, default=settings.SCAN_LEASE_SECONDS)
+        parser.add_argument("--max-jobs", type=int, default=0, help="Exit after this many jobs (0 = run forever).")
+        parser.add_argument("--once", action="store_true", help="Exit when no job is claimable.")
+
+    def handle(self, *args, **options):
+        name = options["name"]
+        capabilities = options["capabilities"] or detect_capabilities()
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        # Plain autocommit writes: SQLite rejects the lock upgrade that
+        # update_or_create's transaction needs when several workers start at once.
+        registration = {
+            "hostname": socket.gethostname(),
+            "pid": os.getpid(),
+            "capabilities": capabilities,
+            "last_heartbeat": timezone.now(),
+        }
+        if not ScanWorker.objects.filter(name=name).update(**registration):
+            ScanWorker.objects.create(name=name, **registration)
+        self.stdout.write(f"Worker {name} started with capabilities: {', '.join(capabilities) or 'none'}")
+
+        processed = 0
+        backoff = max(options["poll_interval"], 1.0)
+        while not self.stopping:
+            # Drop connections that went stale (CONN_MAX_AGE, server restarts)
+            # between jobs, as Django does between requests.
+            close_old_connections()
+            try:
+                ScanWorker.objects.filter(name=name).update(last_heartbeat=timezone.now())
+                job = claim_job(name, capabilities, lease_seconds=options["lease_seconds"])
+            except DatabaseError as exc:
+                self.stderr.write(f"Database unavailable ({exc}); retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+                continue
+            backoff = max(options["poll_interval"], 1.0)
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Claimed {job} ({job.url}, attempt {job.attempts})")
+            try:
+                execute_job(job, name, lease_seconds=options["lease_seconds"])
+                self.stdout.write(self.style.SUCCESS(f"Finished {job.id}"))
+            except LeaseLost:
+                self.stderr.write(f"Job {job.id} was taken over by another worker; results discarded")
+            except Exception as exc:
+                self.stderr.write(f"Job {job.id} failed: {exc}")
+
+            processed += 1
+            if options["max_jobs"] and processed >= options["max_jobs"]:
+                break
+
+        try:
+            ScanWorker.objects.filter(name=name).delete()
+        except DatabaseError:
+            pass  # the row simply stops being counted once its heartbeat is stale
+        self.stdout.write(f"Worker {name} stopped after {processed} job(s)")
+
+    def _stop(self, signum, frame):
+        # Finish the current job; its lease would be reclaimed otherwise anyway.
+        self.stopping = True
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SEARCH_TABLE = "chat_search_index"
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; other databases use chat.search.DatabaseSearchBackend.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "title, body, doc_type UNINDEXED, doc_id UNINDEXED, session_id UNINDEXED, "
+        "host UNINDEXED, tool UNINDEXED, severity UNINDEXED, created_at UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_scan_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='target',
+            field=models.URLField(blank=True, max_length=2048),
+        ),
+        migrations.CreateModel(
+            name='Finding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=255)),
+                ('tool', models.CharField(max_length=32)),
+                ('severity', models.CharField(choices=[('info', 'Info'), ('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('critical', 'Critical'), ('unknown', 'Unknown')], default='info', max_length=16)),
+                ('title', models.CharField(max_length=512)),
+                ('location', models.CharField(blank=True, max_length=2048)),
+                ('detail', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='findings', to='chat.chatmessage')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='findings', to='chat.chatsession')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['host', 'created_at'], name='chat_findin_host_a9ef5e_idx'), models.Index(fields=['tool', 'severity'], name='chat_findin_tool_d59c85_idx')],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
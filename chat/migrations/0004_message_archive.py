@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_findings_and_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='archive_path',
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['role', 'created_at'], name='chat_chatme_role_5fee23_idx'),
+        ),
+    ]
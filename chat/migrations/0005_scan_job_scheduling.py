@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanjob',
+            name='owner_key',
+            field=models.CharField(blank=True, max_length=128),
+        ),
+        migrations.AddField(
+            model_name='scanjob',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Interactive'), (1, 'Normal'), (2, 'Batch')], default=1),
+        ),
+        migrations.AddIndex(
+            model_name='scanjob',
+            index=models.Index(fields=['status', 'priority', 'created_at'], name='chat_scanjo_status_12abec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scanjob',
+            index=models.Index(fields=['owner_key', 'status'], name='chat_scanjo_owner_k_683d88_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:07
+
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+
+def fill_host(apps, schema_editor):
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    for message in ChatMessage.objects.exclude(target='').only('id', 'target').iterator():
+        host = urlparse(message.target).netloc.split(':')[0]
+        ChatMessage.objects.filter(id=message.id).update(host=host)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_scan_job_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='host',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['host', 'created_at'], name='chat_chatme_host_c107ce_idx'),
+        ),
+        migrations.RunPython(fill_host, migrations.RunPython.noop),
+    ]
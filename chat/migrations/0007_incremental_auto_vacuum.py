@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def enable_incremental_vacuum(apps, schema_editor):
+    # auto_vacuum can only be switched on an existing file by a full VACUUM,
+    # which is why this migration is not atomic. It runs once; afterwards
+    # apply_retention releases free pages in small incremental steps.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] == 2:
+            return
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('chat', '0006_message_host'),
+    ]
+
+    operations = [
+        migrations.RunPython(enable_incremental_vacuum, migrations.RunPython.noop, elidable=True),
+    ]
@@ -26,10 +26,117 @@ class ChatMessage(models.Model):
     session = models.ForeignKey(ChatSession, related_name="messages", on_delete=models.CASCADE)
     role = models.CharField(max_length=32, choices=Role.choices)
     content = models.TextField()
+    target = models.URLField(max_length=2048, blank=True)
+    # Host part of target, for exact per-host filters.
+    host = models.CharField(max_length=255, blank=True)
+    # Set once retention has moved the raw content into a compressed file.
+    archive_path = models.CharField(max_length=1024, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=["role", "created_at"]),
+            models.Index(fields=["host", "created_at"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.role} message @ {self.created_at}"
+
+
+class Finding(models.Model):
+    """A normalized result of one scanner about one host."""
+
+    class Severity(models.TextChoices):
+        INFO = "info", "Info"
+        LOW = "low", "Low"
+        MEDIUM = "medium", "Medium"
+        HIGH = "high", "High"
+        CRITICAL = "critical", "Critical"
+        UNKNOWN = "unknown", "Unknown"
+
+    session = models.ForeignKey(ChatSession, related_name="findings", on_delete=models.CASCADE)
+    message = models.ForeignKey(
+        ChatMessage, related_name="findings", null=True, blank=True, on_delete=models.SET_NULL
+    )
+    host = models.CharField(max_length=255)
+    tool = models.CharField(max_length=32)
+    severity = models.CharField(max_length=16, choices=Severity.choices, default=Severity.INFO)
+    title = models.CharField(max_length=512)
+    location = models.CharField(max_length=2048, blank=True)
+    detail = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=["host", "created_at"]),
+            models.Index(fields=["tool", "severity"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.tool} finding on {self.host}: {self.title}"
+
+
+class ScanJob(models.Model):
+    """A queued scan of one URL, claimed by a worker through a lease."""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    class Priority(models.IntegerChoices):
+        INTERACTIVE = 0, "Interactive"
+        NORMAL = 1, "Normal"
+        BATCH = 2, "Batch"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey(ChatSession, related_name="scan_jobs", on_delete=models.CASCADE)
+    url = models.URLField(max_length=2048)
+    profile = models.CharField(max_length=32)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    priority = models.PositiveSmallIntegerField(choices=Priority.choices, default=Priority.NORMAL)
+    # Who the job is accounted to for fair share: an API key digest, a session or a client address.
+    owner_key = models.CharField(max_length=128, blank=True)
+    required_capabilities = models.JSONField(default=list, blank=True)
+    lease_owner = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    assistant_message = models.ForeignKey(
+        ChatMessage, related_name="+", null=True, blank=True, on_delete=models.SET_NULL
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["status", "priority", "created_at"]),
+            models.Index(fields=["owner_key", "status"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"ScanJob({self.id}, {self.status})"
+
+
+class ScanWorker(models.Model):
+    """A scanner worker process and the capabilities it advertises."""
+
+    name = models.CharField(max_length=255, unique=True)
+    hostname = models.CharField(max_length=255)
+    pid = models.PositiveIntegerField()
+    capabilities = models.JSONField(default=list, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    last_heartbeat = models.DateTimeField()
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self) -> str:
+        return f"ScanWorker({self.name})"
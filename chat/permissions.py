@@ -0,0 +1,20 @@
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class HasDataAccess(BasePermission):
+    """
+    Search and exports read findings and reports across every session, so they
+    are limited to staff users and clients sending an X-Api-Key listed in
+    DATA_API_KEYS.
+    """
+
+    message = "Log in as staff or send an X-Api-Key listed in DATA_API_KEYS."
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        api_key = request.headers.get("X-Api-Key") or ""
+        return any(hmac.compare_digest(api_key, allowed) for allowed in settings.DATA_API_KEYS)
@@ -0,0 +1,195 @@
+"""
+Scan pipeline shared by the web tier and the scan workers: run the URL
+scripts, store the results in the session and ask the model for an analysis.
+"""
+import logging
+import json
+from typing import List, Dict, Any, Tuple, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from .findings import save_findings
+from .models import ChatMessage, ChatSession
+from .url_scripts import extract_host, profile_scripts
+
+logger = logging.getLogger(__name__)
+api_key = settings.API_KEY
+model_name = settings.MODEL_NAME
+base_url = settings.BASE_URL
+temperature = settings.TEMPERATURE
+
+
+def run_scan(
+    session: ChatSession,
+    url: str,
+    profile: str,
+    before_commit: Optional[Callable[[ChatMessage], None]] = None,
+) -> Tuple[Dict[str, Any], ChatMessage]:
+    """
+    Run the whole pipeline for a URL and return the script results together
+    with the stored assistant message.
+
+    Nothing is written to the session until the analysis is back; then the
+    scan message, its findings and the analysis are stored in one
+    transaction. before_commit (if given) is called with the analysis inside
+    that transaction and can roll it all back by raising.
+    """
+    # Process URL with scripts in parallel using multithreading
+    logger.info(f"Starting parallel processing of URL: {url}")
+    script_results = process_url_with_scripts(url, profile)
+    logger.info(f"Script processing completed for {url}, passing to AI model")
+
+    # Format script results for display
+    script_results_text = json.dumps(script_results, indent=2)
+    user_message_content = f"Analyze URL and find vulrnability: {url}\n\nScript Results:\n{script_results_text}"
+
+    # Pass the script results to the AI model
+    assistant_reply = call_groq_with_script_results(session, url, user_message_content)
+
+    with transaction.atomic():
+        # Create user message with the full context (URL + script results)
+        user_message = ChatMessage.objects.create(
+            session=session,
+            role=ChatMessage.Role.USER,
+            content=user_message_content,
+            target=url,
+            host=extract_host(url),
+        )
+        save_findings(session, user_message, script_results)
+        assistant_message = ChatMessage.objects.create(
+            session=session,
+            role=ChatMessage.Role.ASSISTANT,
+            content=assistant_reply,
+            target=url,
+            host=extract_host(url),
+        )
+        if before_commit is not None:
+            before_commit(assistant_message)
+    return script_results, assistant_message
+
+
+def run_script(script_func, url: str, *args) -> Dict[str, Any]:
+    """Run a single script function on a URL."""
+    try:
+        return script_func(url, *args)
+    except Exception as e:
+        logger.error(f"Error running script {script_func.__name__} on {url}: {str(e)}")
+        return {
+            'script_name': script_func.__name__,
+            'status': 'error',
+            'error': str(e),
+        }
+
+
+def process_url_with_scripts(url: str, profile: str) -> Dict[str, Any]:
+    """
+    Process a URL by running the profile's scripts in parallel using multithreading,
+    then the follow-up scripts that depend on their results (e.g. nuclei).
+
+    Args:
+        url: The URL to process
+        profile: Name of the scan profile from url_scripts.SCAN_PROFILES
+
+    Returns:
+        Dictionary containing results from all scripts
+    """
+    first_stage_scripts, follow_up_scripts = profile_scripts(profile)
+    results = {
+        'url': url,
+        'profile': profile,
+        'scripts_executed': len(first_stage_scripts) + len(follow_up_scripts),
+        'results': [],
+    }
+
+    # Use ThreadPoolExecutor to run scripts in parallel
+    with ThreadPoolExecutor(max_workers=len(first_stage_scripts)) as executor:
+        # Submit all tasks
+        future_to_script = {
+            executor.submit(run_script, script, url): script
+            for script in first_stage_scripts
+        }
+
+        # Collect results as they complete
+        for future in as_completed(future_to_script):
+            script = future_to_script[future]
+            try:
+                result = future.result()
+                results['results'].append(result)
+                logger.info(f"Script {script.__name__} completed for {url}")
+            except Exception as e:
+                logger.error(f"Script {script.__name__} failed for {url}: {str(e)}")
+                results['results'].append({
+                    'script_name': script.__name__,
+                    'status': 'error',
+                    'error': str(e),
+                })
+
+    # Follow-up scripts see the fingerprint produced by the first stage
+    first_stage_results = list(results['results'])
+    for script in follow_up_scripts:
+        results['results'].append(
+            run_script(script, url, first_stage_results, profile)
+        )
+        logger.info(f"Script {script.__name__} completed for {url}")
+
+    return results
+
+
+def call_groq_with_script_results(session: ChatSession, url: str, user_message_content: str) -> str:
+    """Call Groq API with script results to get AI analysis."""
+    if not api_key:
+        raise ValueError("Set the API_KEY environment variable to continue.")
+
+    # Build message history, ending with the not yet stored message carrying the script results
+    history = build_message_history(session, user_message_content)
+    # Update system prompt to provide better analysis instructions
+    if len(history) > 0 and history[0]["role"] == "system":
+        history[0]["content"] = (
+            "شما AMN Bot هستید، یک دستیار مفید که URLها را تحلیل می‌کند. هنگامی که داده‌های تحلیل URL از چندین اسکریپت به شما ارائه شود، بینش‌های جامع در مورد موارد زیر ارائه دهید: محتوای وب‌سایت و ساختار آن، جنبه‌های فنی (زمان پاسخ، کدهای وضعیت و غیره)، عناصر SEO (متادیتا، سرتیترها، لینک‌ها)، و هر یافته قابل توجه یا توصیه‌ای. مختصر، عملی و قابل اجرا باشید و به داده‌های مرتبط از نتایج اسکریپت‌ها ارجاع دهید (استناد کنید)."
+        )
+
+    payload = {
+        "model": model_name,
+        "messages": history,
+        "temperature": temperature,
+        "enable_thinking" : False 
+    }
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    logger.debug(f"Requesting analysis of {url} from {base_url} ({len(history)} messages)")
+    response = requests.post(
+        f"{base_url}/chat/completions" ,
+        json=payload,
+        headers=headers,
+        timeout=500,  # Longer timeout for AI processing
+    )
+    logger.debug(f"Model answered with status {response.status_code}")
+    response.raise_for_status()
+    data = response.json()
+    choices = data.get("choices")
+    if not choices:
+        raise ValueError("Groq API returned an empty response.")
+    return choices[0]["message"]["content"]
+
+
+def build_message_history(session: ChatSession, pending_content: Optional[str] = None) -> List[dict]:
+    system_prompt = {
+        "role": "system",
+        "content": (
+            "تو یک دستیار هوشمند پیدا کردن آسیب پذیری برنامه های تحت وب هستی . با اطلاعات اراعه شده سعی کن آسیب پذیری ها و باگ های موجود رو کامل پیدا کنی و راهکار های مقابله باهاشون رو به فارسی بگی "
+        ),
+    }
+    history = [system_prompt]
+    latest_messages = list(session.messages.order_by("created_at", "id").all())
+    # The last 10 messages, counting the pending one
+    limit = 10 if pending_content is None else 9
+    for message in latest_messages[-limit:]:
+        history.append({"role": message.role, "content": message.content})
+    if pending_content is not None:
+        history.append({"role": ChatMessage.Role.USER, "content": pending_content})
+    return history
@@ -0,0 +1,219 @@
+"""
+Retention policy: archive old raw scan output, delete expired sessions and
+give the freed pages back to the filesystem.
+
+Every step works in small batches with a pause in between so that scans and
+web requests writing to the same SQLite file never wait long for the lock.
+Findings and LLM reports are never archived; they are the compact part of a
+scan and stay searchable until their session expires.
+"""
+import gzip
+import io
+import logging
+import shutil
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ChatMessage, ChatSession, ScanJob
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for RETENTION_COMPRESSION = 'zstd'
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = {"gzip": ".txt.gz", "zstd": ".txt.zst"}
+ARCHIVED_CONTENT = "[raw scan output archived to {path}]"
+
+# Pages released per PRAGMA incremental_vacuum step.
+VACUUM_PAGES_PER_STEP = 2000
+
+
+def _write_archive(path: Path, content: str, compression: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if compression == "gzip":
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(content)
+    else:
+        with open(path, "wb") as raw:
+            with zstandard.ZstdCompressor(level=10).stream_writer(raw) as writer:
+                writer.write(content.encode("utf-8"))
+
+
+def load_archived_content(message: ChatMessage) -> str:
+    """Return the original content of a message, reading its archive if needed."""
+    if not message.archive_path:
+        return message.content
+    path = Path(message.archive_path)
+    if path.suffix == ".gz":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    if zstandard is None:
+        raise ImproperlyConfigured("Install zstandard to read .zst archives.")
+    with open(path, "rb") as raw:
+        with zstandard.ZstdDecompressor().stream_reader(raw) as reader:
+            return io.TextIOWrapper(reader, encoding="utf-8").read()
+
+
+def archive_raw_output(
+    older_than_days: int,
+    archive_dir: Path,
+    compression: str = "gzip",
+    batch_size: int = 100,
+    pause: float = 0.0,
+    dry_run: bool = False,
+) -> int:
+    """
+    Move the content of scan messages (role USER, which carry the raw tool
+    dumps) older than the cutoff into one compressed file each.
+    """
+    if compression not in ARCHIVE_SUFFIXES:
+        raise ImproperlyConfigured(f"Unknown retention compression {compression!r}.")
+    if compression == "zstd" and zstandard is None:
+        raise ImproperlyConfigured("RETENTION_COMPRESSION = 'zstd' needs the zstandard package.")
+
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    pending = ChatMessage.objects.filter(
+        role=ChatMessage.Role.USER, archive_path="", created_at__lt=cutoff
+    ).order_by("id")
+    if dry_run:
+        return pending.count()
+
+    archived = 0
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        # Write the files before touching the database, so the write lock is
+        # only held for the short UPDATEs below.
+        paths = {}
+        for message in batch:
+            path = archive_dir / str(message.session_id) / f"{message.id}{ARCHIVE_SUFFIXES[compression]}"
+            _write_archive(path, message.content, compression)
+            paths[message.id] = path
+
+        with transaction.atomic():
+            for message_id, path in paths.items():
+                ChatMessage.objects.filter(id=message_id, archive_path="").update(
+                    content=ARCHIVED_CONTENT.format(path=path),
+                    archive_path=str(path),
+                )
+        archived += len(batch)
+        time.sleep(pause)
+    return archived
+
+
+def delete_expired_sessions(
+    older_than_days: int,
+    archive_dir: Path,
+    batch_size: int = 100,
+    pause: float = 0.0,
+    dry_run: bool = False,
+) -> int:
+    """Delete sessions with no activity since the cutoff, and their archives."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    expired = (
+        ChatSession.objects.filter(created_at__lt=cutoff)
+        .exclude(messages__created_at__gte=cutoff)
+        .exclude(scan_jobs__status__in=[ScanJob.Status.QUEUED, ScanJob.Status.RUNNING])
+        .order_by("created_at")
+    )
+    if dry_run:
+        return expired.count()
+
+    deleted = 0
+    while True:
+        session_ids = list(expired.values_list("id", flat=True)[:batch_size])
+        if not session_ids:
+            break
+        with transaction.atomic():
+            ChatSession.objects.filter(id__in=session_ids).delete()
+        for session_id in session_ids:
+            shutil.rmtree(archive_dir / str(session_id), ignore_errors=True)
+        deleted += len(session_ids)
+        time.sleep(pause)
+    return deleted
+
+
+def vacuum(pause: float = 0.0, full: bool = False) -> Optional[int]:
+    """
+    Release free pages of the SQLite database in small steps.
+
+    Incremental vacuum needs auto_vacuum = INCREMENTAL, which only a full
+    VACUUM can switch on for an existing file; pass full=True once to do
+    that (it locks the database for its whole run). Must run outside a
+    transaction. Returns the number of pages released, or None when nothing
+    could be done.
+    """
+    if connection.vendor != "sqlite":
+        return None
+
+    with connection.cursor() as cursor:
+        if full:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            logger.warning("auto_vacuum is not INCREMENTAL; run apply_retention --full-vacuum once.")
+            return None
+
+        cursor.execute("PRAGMA freelist_count")
+        free_pages = cursor.fetchone()[0]
+        released = 0
+        while free_pages:
+            # The pragma frees one page per step of the statement, and a DB-API
+            # execute() steps it only once; executescript() steps it to the end.
+            connection.connection.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})")
+            cursor.execute("PRAGMA freelist_count")
+            remaining = cursor.fetchone()[0]
+            if remaining >= free_pages:
+                break
+            released += free_pages - remaining
+            free_pages = remaining
+            time.sleep(pause)
+
+        # Refresh planner statistics so query plans keep up with the data.
+        cursor.execute("PRAGMA optimize")
+    return released
+
+
+def apply_retention(
+    raw_output_days: Optional[int] = None,
+    session_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    pause: float = 0.0,
+    dry_run: bool = False,
+    run_vacuum: bool = True,
+    full_vacuum: bool = False,
+) -> Dict[str, Optional[int]]:
+    """Run every retention rule with the configured defaults."""
+    raw_output_days = settings.RETENTION_RAW_OUTPUT_DAYS if raw_output_days is None else raw_output_days
+    session_days = settings.RETENTION_SESSION_DAYS if session_days is None else session_days
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    archive_dir = Path(settings.RETENTION_ARCHIVE_DIR)
+
+    summary: Dict[str, Optional[int]] = {"sessions_deleted": 0, "messages_archived": 0, "pages_released": None}
+    # Expired sessions go first so their output is not archived just to be deleted.
+    if session_days:
+        summary["sessions_deleted"] = delete_expired_sessions(
+            session_days, archive_dir, batch_size, pause, dry_run
+        )
+    if raw_output_days:
+        summary["messages_archived"] = archive_raw_output(
+            raw_output_days, archive_dir, settings.RETENTION_COMPRESSION, batch_size, pause, dry_run
+        )
+    if run_vacuum and not dry_run:
+        summary["pages_released"] = vacuum(pause, full_vacuum)
+    return summary
@@ -0,0 +1,163 @@
+"""
+Decide which queued scan runs next and whether a new one is admitted.
+
+Ordering: every job gets a score in seconds, lowest first,
+
+    priority * SCHEDULER_PRIORITY_STEP_SECONDS
+    - seconds waited                                   (aging)
+    + running jobs of the same owner * SCHEDULER_FAIR_SHARE_PENALTY_SECONDS
+
+so interactive scans overtake batch scans, a batch job that has waited long
+enough still gets its turn, and an owner with many jobs in flight yields to
+owners with none.
+
+Admission: when the queue, or one owner's share of it, is full the
+submission is refused with an estimate of when to retry.
+"""
+import hashlib
+import math
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db.models import Count, DurationField, ExpressionWrapper, F
+from django.utils import timezone
+
+from .models import ScanJob, ScanWorker
+
+PROFILE_PRIORITIES = {
+    "quick": ScanJob.Priority.INTERACTIVE,
+    "default": ScanJob.Priority.NORMAL,
+    "deep": ScanJob.Priority.BATCH,
+}
+
+# Used for Retry-After until enough jobs have finished to measure it.
+DEFAULT_JOB_SECONDS = 60
+MIN_RETRY_AFTER = 5
+MAX_RETRY_AFTER = 3600
+
+# Owner keys of clients whose API key is listed in SCHEDULER_API_KEYS.
+LISTED_KEY_PREFIX = "key:"
+
+
+class QueueFull(Exception):
+    """The scan queue cannot take another job right now."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def owner_key(api_key: Optional[str] = None, session_id=None, client_address: Optional[str] = None) -> str:
+    """
+    Pick the identity a job is accounted to. The API key only counts when it
+    is listed in SCHEDULER_API_KEYS, so a client cannot get a fresh quota by
+    sending a new key; otherwise the header is ignored. Keys are stored as
+    digests.
+    """
+    if api_key and api_key in settings.SCHEDULER_API_KEYS:
+        return LISTED_KEY_PREFIX + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+    if session_id:
+        return f"session:{session_id}"
+    return f"ip:{client_address or 'unknown'}"
+
+
+def priority_for(profile: str, requested: Optional[int] = None, owner: str = "") -> int:
+    """
+    The profile's class, or the requested one. Only owners with a listed API
+    key may ask for a higher class than the profile's; anyone can lower it.
+    """
+    default = PROFILE_PRIORITIES.get(profile, ScanJob.Priority.NORMAL)
+    if requested is None:
+        return default
+    if owner.startswith(LISTED_KEY_PREFIX):
+        return requested
+    return max(requested, default)
+
+
+def running_per_owner(now=None) -> Dict[str, int]:
+    now = now or timezone.now()
+    rows = (
+        ScanJob.objects.filter(status=ScanJob.Status.RUNNING, lease_expires_at__gte=now)
+        .values("owner_key")
+        .annotate(running=Count("id"))
+    )
+    return {row["owner_key"]: row["running"] for row in rows}
+
+
+def job_score(job: ScanJob, running: Dict[str, int], now) -> float:
+    waited = (now - job.created_at).total_seconds()
+    return (
+        job.priority * settings.SCHEDULER_PRIORITY_STEP_SECONDS
+        - waited
+        + running.get(job.owner_key, 0) * settings.SCHEDULER_FAIR_SHARE_PENALTY_SECONDS
+    )
+
+
+def order_candidates(jobs: Iterable[ScanJob], running: Dict[str, int], now) -> List[ScanJob]:
+    """
+    Order claimable jobs by score. Jobs of the same owner are charged for each
+    other as well, so one owner's batch is interleaved with everyone else's.
+    """
+    pending = list(jobs)
+    ordered = []
+    charged = Counter(running)
+    while pending:
+        best = min(pending, key=lambda job: job_score(job, charged, now))
+        pending.remove(best)
+        ordered.append(best)
+        charged[best.owner_key] += 1
+    return ordered
+
+
+def average_job_seconds(sample: int = 20) -> float:
+    durations = (
+        ScanJob.objects.filter(status=ScanJob.Status.DONE, started_at__isnull=False, finished_at__isnull=False)
+        .order_by("-finished_at")
+        .annotate(duration=ExpressionWrapper(F("finished_at") - F("started_at"), output_field=DurationField()))
+        .values_list("duration", flat=True)[:sample]
+    )
+    durations = [duration.total_seconds() for duration in durations]
+    return sum(durations) / len(durations) if durations else DEFAULT_JOB_SECONDS
+
+
+def active_workers() -> int:
+    """
+    Workers that are idle-polling or holding a live lease. ScanWorker rows are
+    only touched between jobs, so busy workers are counted by their leases.
+    """
+    now = timezone.now()
+    since = now - timedelta(seconds=2 * settings.SCAN_LEASE_SECONDS)
+    polling = set(ScanWorker.objects.filter(last_heartbeat__gte=since).values_list("name", flat=True))
+    busy = set(
+        ScanJob.objects.filter(status=ScanJob.Status.RUNNING, lease_expires_at__gte=now)
+        .values_list("lease_owner", flat=True)
+        .distinct()
+    )
+    return max(len(polling | busy), 1)
+
+
+def retry_after(jobs_ahead: int) -> int:
+    """Seconds until roughly jobs_ahead jobs have drained from the queue."""
+    seconds = math.ceil(max(jobs_ahead, 1) * average_job_seconds() / active_workers())
+    return min(max(seconds, MIN_RETRY_AFTER), MAX_RETRY_AFTER)
+
+
+def check_admission(key: str) -> None:
+    """Raise QueueFull when the queue or this owner's share of it is full."""
+    queued = ScanJob.objects.filter(status=ScanJob.Status.QUEUED).count()
+    if queued >= settings.SCHEDULER_MAX_QUEUED:
+        raise QueueFull(
+            "The scan queue is full.",
+            retry_after(queued - settings.SCHEDULER_MAX_QUEUED + 1),
+        )
+
+    pending = ScanJob.objects.filter(
+        owner_key=key, status__in=[ScanJob.Status.QUEUED, ScanJob.Status.RUNNING]
+    ).count()
+    if pending >= settings.SCHEDULER_MAX_PENDING_PER_OWNER:
+        raise QueueFull(
+            "Too many scans pending for this client.",
+            retry_after(pending - settings.SCHEDULER_MAX_PENDING_PER_OWNER + 1),
+        )
@@ -0,0 +1,317 @@
+"""
+Full-text search over findings and LLM reports.
+
+The backend is pluggable through settings.SEARCH_BACKEND. SQLiteFTSBackend keeps
+an FTS5 table in step with the models through signals (see chat.signals);
+DatabaseSearchBackend needs no index and works on any database, slowly.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.utils.module_loading import import_string
+
+from .models import ChatMessage, Finding
+
+FINDING = "finding"
+REPORT = "report"
+REPORT_TOOL = "llm"
+
+# Findings and reports share one FTS table; their rowid encodes type and pk
+# so an update or delete never has to scan the index.
+_DOC_TYPE_BITS = {FINDING: 0, REPORT: 1}
+
+TERM_RE = re.compile(r"\w+")
+
+
+def _utc(value: datetime) -> str:
+    return value.astimezone(dt_timezone.utc).isoformat()
+
+
+def _is_report(message: ChatMessage) -> bool:
+    return message.role == ChatMessage.Role.ASSISTANT
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements."""
+
+    def index_finding(self, finding: Finding) -> None:
+        pass
+
+    def index_message(self, message: ChatMessage) -> None:
+        pass
+
+    def remove_finding(self, finding_id: int) -> None:
+        pass
+
+    def remove_message(self, message_id: int) -> None:
+        pass
+
+    def rebuild(self) -> int:
+        """Re-index everything; returns the number of indexed documents."""
+        return 0
+
+    def search(
+        self,
+        query: str,
+        host: Optional[str] = None,
+        tool: Optional[str] = None,
+        severity: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def hosts(
+        self,
+        query: str,
+        host: Optional[str] = None,
+        tool: Optional[str] = None,
+        severity: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[str]:
+        """Every distinct host with a match, however many documents match."""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    table = "chat_search_index"
+
+    @staticmethod
+    def _rowid(doc_type: str, doc_id: int) -> int:
+        return doc_id * 2 + _DOC_TYPE_BITS[doc_type]
+
+    @staticmethod
+    def _finding_row(finding: Finding) -> tuple:
+        return (
+            SQLiteFTSBackend._rowid(FINDING, finding.pk),
+            finding.title,
+            " ".join(filter(None, [finding.location, finding.detail])),
+            FINDING,
+            finding.pk,
+            str(finding.session_id),
+            finding.host,
+            finding.tool,
+            finding.severity,
+            _utc(finding.created_at),
+        )
+
+    @staticmethod
+    def _message_row(message: ChatMessage) -> tuple:
+        return (
+            SQLiteFTSBackend._rowid(REPORT, message.pk),
+            message.target,
+            message.content,
+            REPORT,
+            message.pk,
+            str(message.session_id),
+            message.host,
+            REPORT_TOOL,
+            "",
+            _utc(message.created_at),
+        )
+
+    def _upsert(self, rows: List[tuple]) -> None:
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} "
+                "(rowid, title, body, doc_type, doc_id, session_id, host, tool, severity, created_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def _delete(self, rowid: int) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [rowid])
+
+    def index_finding(self, finding: Finding) -> None:
+        self._upsert([self._finding_row(finding)])
+
+    def index_message(self, message: ChatMessage) -> None:
+        if _is_report(message):
+            self._upsert([self._message_row(message)])
+
+    def remove_finding(self, finding_id: int) -> None:
+        self._delete(self._rowid(FINDING, finding_id))
+
+    def remove_message(self, message_id: int) -> None:
+        self._delete(self._rowid(REPORT, message_id))
+
+    def rebuild(self, chunk_size: int = 500) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+        indexed = 0
+        sources = [
+            (Finding.objects.all(), self._finding_row),
+            (ChatMessage.objects.filter(role=ChatMessage.Role.ASSISTANT), self._message_row),
+        ]
+        for queryset, to_row in sources:
+            rows = []
+            for obj in queryset.iterator(chunk_size=chunk_size):
+                rows.append(to_row(obj))
+                if len(rows) >= chunk_size:
+                    self._upsert(rows)
+                    indexed += len(rows)
+                    rows = []
+            if rows:
+                self._upsert(rows)
+                indexed += len(rows)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')")
+        return indexed
+
+    def _where(self, query, host, tool, severity, since, until) -> Optional[Tuple[str, List[Any]]]:
+        terms = TERM_RE.findall(query)
+        if not terms:
+            return None
+
+        # Quote every term so user input can never be parsed as FTS5 syntax.
+        where = [f"{self.table} MATCH %s"]
+        params: List[Any] = [" ".join(f'"{term}"' for term in terms)]
+        for column, value in (("host", host), ("tool", tool), ("severity", severity)):
+            if value:
+                where.append(f"{column} = %s")
+                params.append(value)
+        if since:
+            where.append("created_at >= %s")
+            params.append(_utc(since))
+        if until:
+            where.append("created_at < %s")
+            params.append(_utc(until))
+        return " AND ".join(where), params
+
+    def search(self, query, host=None, tool=None, severity=None, since=None, until=None, limit=50):
+        clause = self._where(query, host, tool, severity, since, until)
+        if clause is None:
+            return []
+        where, params = clause
+
+        sql = (
+            "SELECT doc_type, doc_id, session_id, host, tool, severity, created_at, title, "
+            f"snippet({self.table}, -1, '[', ']', '...', 16) "
+            f"FROM {self.table} WHERE {where} ORDER BY rank LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            rows = cursor.fetchall()
+
+        return [
+            {
+                "type": doc_type,
+                "id": doc_id,
+                "session_id": session_id,
+                "host": row_host,
+                "tool": row_tool,
+                "severity": row_severity or None,
+                "created_at": created_at,
+                "title": title,
+                "snippet": snippet,
+            }
+            for doc_type, doc_id, session_id, row_host, row_tool, row_severity, created_at, title, snippet in rows
+        ]
+
+    def hosts(self, query, host=None, tool=None, severity=None, since=None, until=None):
+        clause = self._where(query, host, tool, severity, since, until)
+        if clause is None:
+            return []
+        where, params = clause
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT host FROM {self.table} WHERE {where} AND host != '' ORDER BY host", params
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Index-free fallback using LIKE queries; works on any database."""
+
+    def _querysets(self, query, host, tool, severity, since, until) -> Optional[Tuple[QuerySet, QuerySet]]:
+        terms = TERM_RE.findall(query)
+        if not terms:
+            return None
+
+        findings = Finding.objects.all()
+        reports = ChatMessage.objects.filter(role=ChatMessage.Role.ASSISTANT)
+        for term in terms:
+            findings = findings.filter(
+                Q(title__icontains=term) | Q(location__icontains=term) | Q(detail__icontains=term)
+            )
+            reports = reports.filter(content__icontains=term)
+        if host:
+            findings = findings.filter(host=host)
+            reports = reports.filter(host=host)
+        if tool:
+            findings = findings.filter(tool=tool)
+            if tool != REPORT_TOOL:
+                reports = reports.none()
+        if severity:
+            findings = findings.filter(severity=severity)
+            reports = reports.none()
+        if since:
+            findings = findings.filter(created_at__gte=since)
+            reports = reports.filter(created_at__gte=since)
+        if until:
+            findings = findings.filter(created_at__lt=until)
+            reports = reports.filter(created_at__lt=until)
+        return findings, reports
+
+    def search(self, query, host=None, tool=None, severity=None, since=None, until=None, limit=50):
+        querysets = self._querysets(query, host, tool, severity, since, until)
+        if querysets is None:
+            return []
+        findings, reports = querysets
+
+        results = [
+            {
+                "type": FINDING,
+                "id": finding.pk,
+                "session_id": str(finding.session_id),
+                "host": finding.host,
+                "tool": finding.tool,
+                "severity": finding.severity,
+                "created_at": _utc(finding.created_at),
+                "title": finding.title,
+                "snippet": finding.location or finding.detail[:200],
+            }
+            for finding in findings[:limit]
+        ]
+        results += [
+            {
+                "type": REPORT,
+                "id": message.pk,
+                "session_id": str(message.session_id),
+                "host": message.host,
+                "tool": REPORT_TOOL,
+                "severity": None,
+                "created_at": _utc(message.created_at),
+                "title": message.target,
+                "snippet": message.content[:200],
+            }
+            for message in reports[: max(limit - len(results), 0)]
+        ]
+        return results
+
+    def hosts(self, query, host=None, tool=None, severity=None, since=None, until=None):
+        querysets = self._querysets(query, host, tool, severity, since, until)
+        if querysets is None:
+            return []
+        findings, reports = querysets
+
+        hosts = set(findings.exclude(host="").order_by().values_list("host", flat=True).distinct())
+        hosts |= set(reports.exclude(host="").order_by().values_list("host", flat=True).distinct())
+        return sorted(hosts)
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> BaseSearchBackend:
+    return import_string(settings.SEARCH_BACKEND)()
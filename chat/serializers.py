@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from .models import ChatMessage, ChatSession
+from .models import ChatMessage, ChatSession, Finding, ScanJob
+from .url_scripts import DEFAULT_SCAN_PROFILE, SCAN_PROFILES
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
@@ -20,4 +21,53 @@ class ChatSessionSerializer(serializers.ModelSerializer):
 class ChatRequestSerializer(serializers.Serializer):
     url = serializers.URLField()
     session_id = serializers.UUIDField(required=False)
+    profile = serializers.ChoiceField(
+        choices=sorted(SCAN_PROFILES), default=DEFAULT_SCAN_PROFILE
+    )
+    # Defaults to the profile's class: quick scans are interactive, deep scans batch.
+    # Only clients with a listed API key may raise it above that class.
+    priority = serializers.ChoiceField(
+        choices=[label.lower() for label in ScanJob.Priority.labels], required=False
+    )
 
+    def validate_priority(self, value):
+        return ScanJob.Priority[value.upper()]
+
+
+class ScanJobSerializer(serializers.ModelSerializer):
+    reply = serializers.CharField(source="assistant_message.content", default=None, read_only=True)
+
+    class Meta:
+        model = ScanJob
+        fields = (
+            "id",
+            "session",
+            "url",
+            "profile",
+            "status",
+            "priority",
+            "attempts",
+            "lease_owner",
+            "error",
+            "reply",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField()
+    host = serializers.CharField(required=False)
+    tool = serializers.CharField(required=False)
+    severity = serializers.ChoiceField(choices=Finding.Severity.choices, required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    host = serializers.CharField(required=False)
+    session = serializers.UUIDField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
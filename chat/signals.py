@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ChatMessage, Finding
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Finding)
+def index_finding(sender, instance, **kwargs):
+    get_search_backend().index_finding(instance)
+
+
+@receiver(post_delete, sender=Finding)
+def unindex_finding(sender, instance, **kwargs):
+    get_search_backend().remove_finding(instance.pk)
+
+
+@receiver(post_save, sender=ChatMessage)
+def index_message(sender, instance, **kwargs):
+    get_search_backend().index_message(instance)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def unindex_message(sender, instance, **kwargs):
+    get_search_backend().remove_message(instance.pk)
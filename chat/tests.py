@@ -1,16 +1,35 @@
+import io
+import json
+import subprocess
+import tempfile
+from datetime import timedelta
+from pathlib import Path
 from unittest import mock
 
-from django.test import override_settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from .models import ChatSession
+from backend.database import database_config
+
+from .findings import extract_findings, save_findings
+from .jobs import LeaseKeeper, LeaseLost, claim_job, claim_when_scheduled, enqueue_scan, execute_job, heartbeat
+from .models import ChatMessage, ChatSession, Finding, ScanJob
+from .retention import apply_retention, load_archived_content
+from .scheduler import QueueFull, retry_after
+from .search import DatabaseSearchBackend, get_search_backend
+from .url_scripts import nuclei_scan, nuclei_tags_from_results, parse_nuclei_line, stream_command
 
 
 class ChatCompletionViewTests(APITestCase):
     def setUp(self):
-        patcher = mock.patch("chat.views.requests.post")
+        patcher = mock.patch("chat.pipeline.requests.post")
         self.addCleanup(patcher.stop)
         self.mock_post = patcher.start()
         mock_response = mock.MagicMock()
@@ -30,4 +49,622 @@ class ChatCompletionViewTests(APITestCase):
         self.assertEqual(len(response.data["messages"]), 2)
         self.assertEqual(ChatSession.objects.count(), 1)
 
-# Create your tests here.
+
+class NucleiScanTests(SimpleTestCase):
+    WHATWEB_RESULT = {
+        "script_name": "whatweb scan for vulnrability",
+        "script_output": "https://blog.example.com [200 OK] Apache[2.4.41], PHP[7.4.3], WordPress[6.4.2]",
+    }
+    NMAP_RESULT = {
+        "script_name": "nmap scan for vulnrability",
+        "script_output": "PORT     STATE SERVICE\n22/tcp   open  ssh\n443/tcp  open  https\n3306/tcp closed mysql\n",
+    }
+    NUCLEI_LINE = (
+        '{"template-id": "wordpress-readme-file", "info": {"name": "WordPress readme.html", '
+        '"severity": "info", "tags": ["wordpress", "exposure"]}, "type": "http", '
+        '"host": "https://blog.example.com", "matched-at": "https://blog.example.com/readme.html"}'
+    )
+
+    def test_tags_follow_fingerprint(self):
+        tags = nuclei_tags_from_results([self.WHATWEB_RESULT, self.NMAP_RESULT])
+        self.assertEqual(tags, ["wordpress", "wp-plugin", "php", "apache", "ssh"])
+
+    def test_target_url_is_not_a_fingerprint(self):
+        result = {"script_name": "whatweb", "script_output": "http://wordpress.example.com [200 OK] nginx[1.24]"}
+        self.assertEqual(nuclei_tags_from_results([result]), ["nginx"])
+
+    def test_parse_nuclei_line(self):
+        finding = parse_nuclei_line(self.NUCLEI_LINE)
+        self.assertEqual(finding["template_id"], "wordpress-readme-file")
+        self.assertEqual(finding["severity"], "info")
+        self.assertEqual(finding["matched_at"], "https://blog.example.com/readme.html")
+        self.assertIsNone(parse_nuclei_line("[INF] Using Nuclei Engine 3.3.7"))
+        self.assertIsNone(parse_nuclei_line("{not json"))
+
+    def test_scan_uses_profile_and_selected_tags(self):
+        with mock.patch("chat.url_scripts.stream_command", return_value=iter([self.NUCLEI_LINE, "\n"])) as stream:
+            result = nuclei_scan("https://blog.example.com", [self.WHATWEB_RESULT], "quick")
+        command = stream.call_args[0][0]
+        self.assertIn("-rl 50 -c 10", command)
+        self.assertIn("-tags wordpress,wp-plugin,php,apache,exposure", command)
+        self.assertEqual(result["total_found"], 1)
+        self.assertEqual(result["results"][0]["template_id"], "wordpress-readme-file")
+
+    def test_stream_command_yields_lines_and_times_out(self):
+        self.assertEqual(list(stream_command("printf 'a\\nb\\n'")), ["a\n", "b\n"])
+        with self.assertRaises(subprocess.TimeoutExpired):
+            list(stream_command("sleep 5", timeout=0.2))
+
+    def test_stream_command_reports_failures(self):
+        lines = []
+        with self.assertRaises(subprocess.CalledProcessError) as caught:
+            for line in stream_command("echo found; echo first >&2; echo broken >&2; exit 3", stderr_lines=1):
+                lines.append(line)
+        self.assertEqual(lines, ["found\n"])
+        self.assertEqual(caught.exception.returncode, 3)
+        self.assertEqual(caught.exception.stderr, "broken")
+
+    def test_missing_nuclei_is_an_error(self):
+        with mock.patch("chat.url_scripts.stream_command", side_effect=subprocess.CalledProcessError(
+            127, "nuclei", stderr="sh: 1: nuclei: not found"
+        )):
+            result = nuclei_scan("https://blog.example.com", [], "quick")
+        self.assertEqual(result["error"], "exited with status 127: sh: 1: nuclei: not found")
+        self.assertEqual(result["total_found"], 0)
+
+
+class ScanJobLeaseTests(TestCase):
+    ALL_TOOLS = ["nmap", "dirsearch", "nikto", "whatweb", "nuclei"]
+
+    def setUp(self):
+        self.session = ChatSession.objects.create()
+        self.job = enqueue_scan(self.session, "https://example.com", "default")
+
+    def test_only_one_worker_wins_a_claim(self):
+        claimed = claim_job("worker-a", self.ALL_TOOLS)
+        self.assertEqual(claimed.id, self.job.id)
+        self.assertEqual(claimed.status, ScanJob.Status.RUNNING)
+        self.assertEqual(claimed.lease_owner, "worker-a")
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(claim_job("worker-b", self.ALL_TOOLS))
+
+    def test_worker_without_capabilities_skips_job(self):
+        self.assertIsNone(claim_job("worker-a", ["nmap"]))
+        self.assertIsNotNone(claim_job("worker-b", self.ALL_TOOLS))
+
+    def test_requirements_follow_profile(self):
+        quick = enqueue_scan(self.session, "https://example.com", "quick")
+        self.assertEqual(quick.required_capabilities, ["nmap", "whatweb", "nuclei"])
+        self.assertEqual(claim_job("worker-a", ["nmap", "whatweb", "nuclei"]).id, quick.id)
+        self.assertIsNone(claim_job("worker-a", ["nmap", "whatweb", "nuclei"]))
+
+    def test_expired_lease_is_reclaimed(self):
+        claim_job("worker-a", self.ALL_TOOLS)
+        ScanJob.objects.filter(id=self.job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        reclaimed = claim_job("worker-b", self.ALL_TOOLS)
+        self.assertEqual(reclaimed.lease_owner, "worker-b")
+        self.assertEqual(reclaimed.attempts, 2)
+        self.assertFalse(heartbeat(self.job, "worker-a"))
+        self.assertTrue(heartbeat(self.job, "worker-b"))
+
+    @override_settings(SCAN_JOB_MAX_ATTEMPTS=1)
+    def test_job_fails_after_last_attempt_expires(self):
+        claim_job("worker-a", self.ALL_TOOLS)
+        ScanJob.objects.filter(id=self.job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNone(claim_job("worker-b", self.ALL_TOOLS))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ScanJob.Status.FAILED)
+
+    @mock.patch("chat.pipeline.call_groq_with_script_results", return_value="ok")
+    @mock.patch("chat.pipeline.process_url_with_scripts", return_value={"results": []})
+    def test_execute_job_records_outcome(self, process, call_groq):
+        job = claim_job("worker-a", self.ALL_TOOLS)
+        _, reply = execute_job(job, "worker-a")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScanJob.Status.DONE)
+        self.assertEqual(job.assistant_message, reply)
+        self.assertEqual(reply.content, "ok")
+        self.assertIsNone(job.lease_expires_at)
+
+    @mock.patch("chat.management.commands.scan_worker.time.sleep")
+    def test_worker_survives_database_errors(self, sleep):
+        with mock.patch(
+            "chat.management.commands.scan_worker.claim_job",
+            side_effect=[OperationalError("database is locked"), None],
+        ) as claim:
+            call_command("scan_worker", "--once", "--name", "w", stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(claim.call_count, 2)
+        sleep.assert_called_once()
+
+    @mock.patch("chat.jobs.HEARTBEAT_RETRY_SECONDS", 0)
+    def test_heartbeat_retries_database_errors(self):
+        keeper = LeaseKeeper(self.job, "worker-a")
+        with mock.patch("chat.jobs.heartbeat", side_effect=[OperationalError("database is locked"), True]):
+            self.assertTrue(keeper._beat())
+        with mock.patch("chat.jobs.heartbeat", side_effect=OperationalError("database is locked")):
+            self.assertFalse(keeper._beat())
+
+    @mock.patch("chat.pipeline.call_groq_with_script_results", return_value="analysis")
+    @mock.patch("chat.pipeline.process_url_with_scripts", return_value={"results": []})
+    def test_lost_lease_stores_nothing(self, process, call_groq):
+        job = claim_job("worker-a", self.ALL_TOOLS)
+        ScanJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        claim_job("worker-b", self.ALL_TOOLS)
+
+        with self.assertRaises(LeaseLost):
+            execute_job(job, "worker-a")
+        self.assertFalse(self.session.messages.exists())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScanJob.Status.RUNNING)
+        self.assertEqual(job.lease_owner, "worker-b")
+
+        execute_job(job, "worker-b")
+        self.assertEqual(self.session.messages.count(), 2)
+
+    def test_failed_scan_is_recorded(self):
+        job = claim_job("worker-a", self.ALL_TOOLS)
+        with mock.patch("chat.jobs.run_scan", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                execute_job(job, "worker-a")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScanJob.Status.FAILED)
+        self.assertEqual(job.error, "boom")
+
+
+@override_settings(SCAN_EXECUTION="queue")
+class QueuedChatCompletionTests(APITestCase):
+    def test_enqueues_job_and_returns_accepted(self):
+        response = self.client.post(reverse("chat-completion"), {"url": "https://example.com"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = ScanJob.objects.get()
+        self.assertEqual(response.data["job_id"], str(job.id))
+        self.assertEqual(job.status, ScanJob.Status.QUEUED)
+
+        detail = self.client.get(reverse("scan-job-detail", args=[job.id]))
+        self.assertEqual(detail.data["status"], "queued")
+        self.assertIsNone(detail.data["reply"])
+
+
+SCAN_RESULTS = {
+    "url": "https://shop.example.com",
+    "results": [
+        {
+            "script_name": "nmap scan for vulnrability",
+            "script_output": "PORT   STATE SERVICE\n80/tcp open  http\n3306/tcp open  mysql\n",
+        },
+        {
+            "script_name": "dirsearch",
+            "results": [{"status": 200, "path": "/phpmyadmin/", "url": "https://shop.example.com/phpmyadmin/"}],
+        },
+        {
+            "script_name": "nikto scan for vulnrability",
+            "script_output": "+ Target IP: 10.0.0.1\n+ Server: nginx/1.18.0\n+ /: The X-Frame-Options header is not present.\n",
+        },
+        {
+            "script_name": "nuclei",
+            "results": [{
+                "template_id": "mysql-exposed", "name": "MySQL exposed", "severity": "high",
+                "matched_at": "shop.example.com:3306", "tags": ["network"], "extracted_results": [],
+            }],
+        },
+    ],
+}
+
+
+class FindingExtractionTests(SimpleTestCase):
+    def test_normalizes_each_tool(self):
+        findings = extract_findings(SCAN_RESULTS)
+        titles = {(f["tool"], f["title"]) for f in findings}
+        self.assertEqual(
+            titles,
+            {
+                ("nmap", "80/tcp open http"),
+                ("nmap", "3306/tcp open mysql"),
+                ("dirsearch", "200 /phpmyadmin/"),
+                ("nikto", "Server: nginx/1.18.0"),
+                ("nikto", "The X-Frame-Options header is not present."),
+                ("nuclei", "MySQL exposed"),
+            },
+        )
+        self.assertTrue(all(f["host"] == "shop.example.com" for f in findings))
+        self.assertEqual([f["severity"] for f in findings if f["tool"] == "nuclei"], ["high"])
+
+
+@override_settings(DATA_API_KEYS=["reader"])
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create()
+        self.scan = ChatMessage.objects.create(
+            session=self.session, role=ChatMessage.Role.USER, content="raw", target=SCAN_RESULTS["url"]
+        )
+        save_findings(self.session, self.scan, SCAN_RESULTS)
+        self.report = ChatMessage.objects.create(
+            session=self.session,
+            role=ChatMessage.Role.ASSISTANT,
+            content="The phpMyAdmin panel is publicly reachable.",
+            target=SCAN_RESULTS["url"],
+            host="shop.example.com",
+        )
+
+    def search(self, **params):
+        response = self.client.get(reverse("search"), params, HTTP_X_API_KEY="reader")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_finds_findings_and_reports(self):
+        data = self.search(q="/phpmyadmin")
+        self.assertEqual(data["hosts"], ["shop.example.com"])
+        self.assertEqual({r["type"] for r in data["results"]}, {"finding", "report"})
+
+    def test_filters(self):
+        self.assertEqual(self.search(q="phpmyadmin", tool="dirsearch")["count"], 1)
+        self.assertEqual(self.search(q="mysql", severity="high")["results"][0]["tool"], "nuclei")
+        self.assertEqual(self.search(q="phpmyadmin", host="other.example.com")["count"], 0)
+        self.assertEqual(self.search(q="phpmyadmin", since="2999-01-01T00:00:00Z")["count"], 0)
+
+    def test_index_follows_deletes(self):
+        self.session.delete()
+        self.assertEqual(self.search(q="phpmyadmin")["count"], 0)
+
+    def test_database_backend_matches_fts_backend(self):
+        fts = {(r["type"], r["id"]) for r in get_search_backend().search("phpmyadmin")}
+        like = {(r["type"], r["id"]) for r in DatabaseSearchBackend().search("phpmyadmin")}
+        self.assertEqual(fts, like)
+
+    def test_requires_staff_or_listed_key(self):
+        self.assertEqual(self.client.get(reverse("search"), {"q": "nginx"}).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse("search"), {"q": "nginx"}, HTTP_X_API_KEY="made-up")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_hosts_are_not_limited_to_the_returned_hits(self):
+        other = ChatSession.objects.create()
+        save_findings(other, None, {**SCAN_RESULTS, "url": "https://other.example.com"})
+        data = self.search(q="phpmyadmin", limit=1)
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(data["hosts"], ["other.example.com", "shop.example.com"])
+        self.assertEqual(DatabaseSearchBackend().hosts("phpmyadmin"), data["hosts"])
+
+    def test_host_filter_is_exact_in_both_backends(self):
+        ChatMessage.objects.create(
+            session=self.session,
+            role=ChatMessage.Role.ASSISTANT,
+            content="Another phpMyAdmin panel.",
+            target="https://shop.example.com.attacker.net/",
+            host="shop.example.com.attacker.net",
+        )
+        for backend in (get_search_backend(), DatabaseSearchBackend()):
+            reports = [r for r in backend.search("phpmyadmin", host="shop.example.com") if r["type"] == "report"]
+            self.assertEqual([r["id"] for r in reports], [self.report.id])
+
+    def test_rebuild(self):
+        self.assertEqual(get_search_backend().rebuild(), Finding.objects.count() + 1)
+        self.assertEqual(self.search(q="phpmyadmin")["count"], 2)
+
+    def test_backfill_legacy_scan_messages(self):
+        legacy = ChatSession.objects.create()
+        ChatMessage.objects.create(
+            session=legacy,
+            role=ChatMessage.Role.USER,
+            content=f"Analyze URL: https://legacy.example.com\n\nScript Results:\n{json.dumps({**SCAN_RESULTS, 'url': 'https://legacy.example.com'})}",
+        )
+        answer = ChatMessage.objects.create(session=legacy, role=ChatMessage.Role.ASSISTANT, content="Legacy phpMyAdmin report.")
+        ChatMessage.objects.create(session=legacy, role=ChatMessage.Role.USER, content="hi")
+
+        call_command("rebuild_search_index", "--backfill", stdout=io.StringIO())
+
+        self.assertEqual(Finding.objects.filter(session=legacy, host="legacy.example.com").count(), len(extract_findings(SCAN_RESULTS)))
+        answer.refresh_from_db()
+        self.assertEqual(answer.host, "legacy.example.com")
+        results = self.search(q="phpmyadmin", host="legacy.example.com")["results"]
+        self.assertEqual({r["type"] for r in results}, {"finding", "report"})
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = Path(tmp.name)
+        settings_override = override_settings(RETENTION_ARCHIVE_DIR=self.archive_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def make_scan(self, age_days):
+        session = ChatSession.objects.create()
+        scan = ChatMessage.objects.create(
+            session=session, role=ChatMessage.Role.USER, content="raw output " * 100, target=SCAN_RESULTS["url"]
+        )
+        save_findings(session, scan, SCAN_RESULTS)
+        report = ChatMessage.objects.create(session=session, role=ChatMessage.Role.ASSISTANT, content="report")
+        created_at = timezone.now() - timedelta(days=age_days)
+        ChatSession.objects.filter(id=session.id).update(created_at=created_at)
+        ChatMessage.objects.filter(session=session).update(created_at=created_at)
+        return session, scan, report
+
+    def test_archives_old_raw_output_only(self):
+        old_session, old_scan, old_report = self.make_scan(age_days=40)
+        _, new_scan, _ = self.make_scan(age_days=1)
+
+        summary = apply_retention(raw_output_days=30, session_days=0, run_vacuum=False)
+        self.assertEqual(summary["messages_archived"], 1)
+
+        old_scan.refresh_from_db()
+        self.assertTrue(old_scan.archive_path.endswith(".txt.gz"))
+        self.assertTrue(old_scan.archive_path.startswith(str(self.archive_dir / str(old_session.id))))
+        self.assertNotIn("raw output", old_scan.content)
+        self.assertEqual(load_archived_content(old_scan), "raw output " * 100)
+
+        old_report.refresh_from_db()
+        self.assertEqual(old_report.content, "report")
+        self.assertEqual(old_session.findings.count(), len(extract_findings(SCAN_RESULTS)))
+        new_scan.refresh_from_db()
+        self.assertEqual(new_scan.archive_path, "")
+
+        # A second run has nothing left to do.
+        self.assertEqual(apply_retention(raw_output_days=30, session_days=0, run_vacuum=False)["messages_archived"], 0)
+
+    def test_deletes_expired_sessions_with_their_archives(self):
+        old_session, _, _ = self.make_scan(age_days=200)
+        recent_session, _, _ = self.make_scan(age_days=10)
+        apply_retention(raw_output_days=5, session_days=0, run_vacuum=False)
+        self.assertTrue((self.archive_dir / str(old_session.id)).exists())
+
+        self.assertEqual(apply_retention(session_days=180, raw_output_days=0, dry_run=True)["sessions_deleted"], 1)
+        summary = apply_retention(session_days=180, raw_output_days=0, run_vacuum=False)
+        self.assertEqual(summary["sessions_deleted"], 1)
+        self.assertEqual(list(ChatSession.objects.values_list("id", flat=True)), [recent_session.id])
+        self.assertFalse((self.archive_dir / str(old_session.id)).exists())
+        self.assertFalse(Finding.objects.filter(session_id=old_session.id).exists())
+
+    def test_session_with_recent_activity_is_kept(self):
+        session, _, _ = self.make_scan(age_days=200)
+        ChatMessage.objects.create(session=session, role=ChatMessage.Role.USER, content="again")
+        self.assertEqual(apply_retention(session_days=180, raw_output_days=0, run_vacuum=False)["sessions_deleted"], 0)
+
+
+class RetentionVacuumTests(TransactionTestCase):
+    # VACUUM and incremental_vacuum cannot run inside TestCase's transaction.
+
+    def free_pages(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA freelist_count")
+            return cursor.fetchone()[0]
+
+    def test_vacuum_releases_free_pages_in_steps(self):
+        # Migration 0007 switched auto_vacuum to INCREMENTAL.
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA auto_vacuum")
+            self.assertEqual(cursor.fetchone()[0], 2)
+        session = ChatSession.objects.create()
+        ChatMessage.objects.bulk_create(
+            ChatMessage(session=session, role=ChatMessage.Role.USER, content="x" * 4000) for _ in range(100)
+        )
+        session.delete()
+        free_pages = self.free_pages()
+        self.assertGreater(free_pages, 100)
+
+        with mock.patch("chat.retention.VACUUM_PAGES_PER_STEP", 25), mock.patch("chat.retention.time.sleep") as sleep:
+            summary = apply_retention(raw_output_days=0, session_days=0, run_vacuum=True)
+        self.assertEqual(summary["pages_released"], free_pages)
+        self.assertEqual(sleep.call_count, -(-free_pages // 25))
+        self.assertEqual(self.free_pages(), 0)
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite_uses_wal_and_immediate_transactions(self):
+        config = database_config("sqlite:////app/db.sqlite3")
+        self.assertEqual(config["NAME"], "/app/db.sqlite3")
+        self.assertIn("journal_mode=WAL", config["OPTIONS"]["init_command"])
+        self.assertEqual(config["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(config["CONN_MAX_AGE"], 600)
+        self.assertEqual(database_config("sqlite:///db.sqlite3")["NAME"], "db.sqlite3")
+
+    def test_postgres(self):
+        config = database_config("postgres://amn:p%40ss@db:5432/amnbot?sslmode=require", conn_max_age=60)
+        self.assertEqual(config["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(
+            (config["NAME"], config["USER"], config["PASSWORD"], config["HOST"], config["PORT"]),
+            ("amnbot", "amn", "p@ss", "db", "5432"),
+        )
+        self.assertEqual(config["OPTIONS"], {"sslmode": "require"})
+        self.assertEqual(config["CONN_MAX_AGE"], 60)
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_config("mysql://localhost/amnbot")
+
+
+class SchedulerTests(TestCase):
+    ALL_TOOLS = ScanJobLeaseTests.ALL_TOOLS
+
+    def setUp(self):
+        self.session = ChatSession.objects.create()
+
+    def enqueue(self, profile="default", owner="a", age=0):
+        job = enqueue_scan(self.session, "https://example.com", profile, owner_key=owner)
+        ScanJob.objects.filter(id=job.id).update(created_at=timezone.now() - timedelta(seconds=age))
+        return job
+
+    def test_interactive_overtakes_batch(self):
+        self.enqueue("deep", age=10)
+        interactive = self.enqueue("quick")
+        self.assertEqual(claim_job("w", self.ALL_TOOLS).id, interactive.id)
+
+    def test_aged_batch_job_gets_its_turn(self):
+        batch = self.enqueue("deep", age=700)
+        self.enqueue("quick")
+        self.assertEqual(claim_job("w", self.ALL_TOOLS).id, batch.id)
+
+    def test_owner_with_running_jobs_yields(self):
+        self.enqueue(owner="a", age=120)
+        claim_job("w1", self.ALL_TOOLS)
+        self.enqueue(owner="a", age=60)
+        other = self.enqueue(owner="b")
+        self.assertEqual(claim_job("w2", self.ALL_TOOLS).id, other.id)
+
+    def test_retry_after_follows_recent_job_durations(self):
+        job = self.enqueue()
+        now = timezone.now()
+        ScanJob.objects.filter(id=job.id).update(
+            status=ScanJob.Status.DONE, started_at=now - timedelta(seconds=30), finished_at=now
+        )
+        self.assertEqual(retry_after(3), 90)
+
+    def test_busy_workers_count_towards_retry_after(self):
+        self.test_retry_after_follows_recent_job_durations()
+        self.enqueue()
+        self.enqueue()
+        claim_job("w1", self.ALL_TOOLS)
+        claim_job("w2", self.ALL_TOOLS)
+        self.assertEqual(retry_after(4), 60)
+
+    def test_clients_cannot_raise_their_priority(self):
+        escalated = enqueue_scan(
+            self.session, "https://example.com", "deep", priority=ScanJob.Priority.INTERACTIVE, owner_key="ip:1"
+        )
+        self.assertEqual(escalated.priority, ScanJob.Priority.BATCH)
+        normal = self.enqueue("default", owner="ip:2")
+        self.assertEqual(claim_job("w", self.ALL_TOOLS).id, normal.id)
+
+        lowered = enqueue_scan(self.session, "https://example.com", "quick", priority=ScanJob.Priority.BATCH)
+        self.assertEqual(lowered.priority, ScanJob.Priority.BATCH)
+        listed = enqueue_scan(
+            self.session, "https://example.com", "deep", priority=ScanJob.Priority.INTERACTIVE, owner_key="key:abc"
+        )
+        self.assertEqual(listed.priority, ScanJob.Priority.INTERACTIVE)
+
+    def test_abandoned_inline_job_releases_its_place(self):
+        orphan = self.enqueue("quick", owner="gone", age=60)
+        ScanJob.objects.filter(id=orphan.id).update(heartbeat_at=timezone.now() - timedelta(seconds=60))
+        waiting = self.enqueue("default", owner="here")
+
+        self.assertEqual(claim_when_scheduled(waiting, "web-1", slots=1, wait_seconds=0).id, waiting.id)
+        self.assertEqual(ScanJob.objects.get(id=orphan.id).status, ScanJob.Status.FAILED)
+
+    def test_inline_request_waits_for_its_turn(self):
+        batch = self.enqueue("deep", age=10)
+        interactive = self.enqueue("quick")
+        with self.assertRaises(QueueFull):
+            claim_when_scheduled(batch, "web-1", slots=1, wait_seconds=0)
+        self.assertEqual(ScanJob.objects.get(id=batch.id).status, ScanJob.Status.FAILED)
+
+        self.assertEqual(claim_when_scheduled(interactive, "web-2", slots=1, wait_seconds=0).id, interactive.id)
+        later = self.enqueue("quick")
+        with self.assertRaises(QueueFull):
+            claim_when_scheduled(later, "web-3", slots=1, wait_seconds=0)
+
+
+@override_settings(SCAN_EXECUTION="queue", SCHEDULER_MAX_PENDING_PER_OWNER=1, SCHEDULER_API_KEYS=["key-a", "key-b"])
+class BackpressureTests(APITestCase):
+    def submit(self, api_key, **data):
+        return self.client.post(
+            reverse("chat-completion"), {"url": "https://example.com", **data}, format="json", HTTP_X_API_KEY=api_key
+        )
+
+    def test_owner_over_limit_gets_429(self):
+        self.assertEqual(self.submit("key-a", profile="deep").status_code, status.HTTP_202_ACCEPTED)
+        response = self.submit("key-a")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response["Retry-After"]), 5)
+        self.assertEqual(self.submit("key-b").status_code, status.HTTP_202_ACCEPTED)
+
+        self.assertEqual(ScanJob.objects.get(priority=ScanJob.Priority.BATCH).profile, "deep")
+        self.assertNotIn("key-a", ScanJob.objects.values_list("owner_key", flat=True)[0])
+
+    def test_unlisted_keys_do_not_get_their_own_quota(self):
+        self.assertEqual(self.submit("made-up-1").status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.submit("made-up-2").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(ScanJob.objects.get().owner_key.startswith("ip:"))
+
+    @override_settings(SCAN_EXECUTION="inline", SCAN_INLINE_CONCURRENCY=1, SCAN_INLINE_WAIT_SECONDS=0)
+    def test_inline_scan_without_free_slot_gets_429(self):
+        enqueue_scan(ChatSession.objects.create(), "https://example.com", "default", owner_key="other")
+        claim_job("worker-a")
+
+        response = self.submit("key-a")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(ScanJob.objects.filter(status=ScanJob.Status.FAILED).count(), 1)
+
+    @override_settings(SCHEDULER_MAX_QUEUED=1, SCHEDULER_MAX_PENDING_PER_OWNER=10)
+    def test_full_queue_gets_429(self):
+        self.assertEqual(self.submit("key-a", priority="interactive").status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.submit("key-b").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(ScanJob.objects.get().priority, ScanJob.Priority.INTERACTIVE)
+
+
+@override_settings(DATA_API_KEYS=["reader"])
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.session = ChatSession.objects.create()
+        scan = ChatMessage.objects.create(
+            session=self.session, role=ChatMessage.Role.USER, content="raw", target=SCAN_RESULTS["url"]
+        )
+        self.findings = save_findings(self.session, scan, SCAN_RESULTS)
+        ChatMessage.objects.create(
+            session=self.session,
+            role=ChatMessage.Role.ASSISTANT,
+            content="report",
+            target=SCAN_RESULTS["url"],
+            host="shop.example.com",
+        )
+        other = ChatSession.objects.create()
+        Finding.objects.create(session=other, host="other.example.com", tool="nmap", title="22/tcp open ssh")
+        # Contains "//shop.example.com" but is about another host.
+        ChatMessage.objects.create(
+            session=other,
+            role=ChatMessage.Role.ASSISTANT,
+            content="lookalike report",
+            target="https://shop.example.com.attacker.net/?next=//shop.example.com",
+            host="shop.example.com.attacker.net",
+        )
+
+    def export(self, export_format, **params):
+        response = self.client.get(reverse("export", args=[export_format]), params, HTTP_X_API_KEY="reader")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        records = [json.loads(line) for line in self.export("ndjson").splitlines()]
+        self.assertEqual(len(records), len(self.findings) + 3)
+        self.assertEqual(records[-1]["type"], "report")
+
+        records = [json.loads(line) for line in self.export("ndjson", host="shop.example.com").splitlines()]
+        self.assertEqual({r["session_id"] for r in records}, {str(self.session.id)})
+        self.assertEqual(len(records), len(self.findings) + 1)
+
+        records = self.export("ndjson", since="2999-01-01T00:00:00Z")
+        self.assertEqual(records, "")
+
+    def test_sarif(self):
+        document = json.loads(self.export("sarif", session=str(self.session.id)))
+        self.assertEqual(document["version"], "2.1.0")
+        runs = {run["tool"]["driver"]["name"]: run["results"] for run in document["runs"]}
+        self.assertEqual(set(runs), {"dirsearch", "nikto", "nmap", "nuclei", "AMN Bot analysis"})
+        self.assertEqual(runs["nuclei"][0]["level"], "error")
+        self.assertEqual(len(runs["nmap"]), 2)
+
+        empty = json.loads(self.export("sarif", since="2999-01-01T00:00:00Z"))
+        self.assertEqual(empty["runs"], [])
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse("export", args=["csv"]), HTTP_X_API_KEY="reader")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_staff_or_listed_key(self):
+        self.assertEqual(self.client.get(reverse("export", args=["ndjson"])).status_code, status.HTTP_403_FORBIDDEN)
+
+        staff = User.objects.create_user("admin", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse("export", args=["ndjson"])).status_code, status.HTTP_200_OK)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "out.ndjson"
+            call_command("export_findings", "--output", str(path), "--host", "other.example.com")
+            records = [json.loads(line) for line in path.read_text().splitlines()]
+        self.assertEqual([r["title"] for r in records], ["22/tcp open ssh"])
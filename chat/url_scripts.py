@@ -6,10 +6,14 @@ import logging
 from urllib.parse import urlparse
 import subprocess
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable, Optional, Callable, Tuple
 import os
 import uuid
 import re
+import json
+import signal
+import tempfile
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +21,73 @@ DIRSEARCH_LINE_RE = re.compile(
     r"^(\d+)\s+(\S+)\s+(.+)$"  # Match: status size url
 )
 
+NMAP_OPEN_PORT_RE = re.compile(
+    r"^(\d+)/(tcp|udp)\s+open\s+(\S+)"  # Match: 80/tcp open http
+)
+
+# Scan profiles trade coverage for runtime. "tools" picks the scripts a
+# profile runs (and so the binaries a worker needs for it); the nuclei_*
+# options tune nuclei. "default" must stay small enough for the chat pipeline.
+SCAN_PROFILES = {
+    "quick": {
+        "tools": ["nmap", "whatweb", "nuclei"],
+        "nuclei_rate_limit": 50,
+        "nuclei_concurrency": 10,
+        "nuclei_timeout": 180,
+        "nuclei_severity": "medium,high,critical",
+        "nuclei_baseline_tags": ["exposure"],
+    },
+    "default": {
+        "tools": ["nmap", "dirsearch", "nikto", "whatweb", "nuclei"],
+        "nuclei_rate_limit": 100,
+        "nuclei_concurrency": 25,
+        "nuclei_timeout": 300,
+        "nuclei_severity": "low,medium,high,critical",
+        "nuclei_baseline_tags": ["exposure", "misconfig"],
+    },
+    "deep": {
+        "tools": ["nmap", "dirsearch", "nikto", "whatweb", "nuclei"],
+        "nuclei_rate_limit": 150,
+        "nuclei_concurrency": 50,
+        "nuclei_timeout": 900,
+        "nuclei_severity": "low,medium,high,critical",
+        "nuclei_baseline_tags": ["exposure", "misconfig", "default-login", "cve"],
+    },
+}
+DEFAULT_SCAN_PROFILE = "default"
+
+# Technology names as they appear in whatweb output -> nuclei template tags.
+NUCLEI_TECH_TAGS = {
+    "wordpress": ["wordpress", "wp-plugin"],
+    "joomla": ["joomla"],
+    "drupal": ["drupal"],
+    "magento": ["magento"],
+    "phpmyadmin": ["phpmyadmin"],
+    "laravel": ["laravel"],
+    "django": ["django"],
+    "php": ["php"],
+    "apache": ["apache"],
+    "nginx": ["nginx"],
+    "microsoft-iis": ["iis"],
+    "tomcat": ["tomcat"],
+    "jenkins": ["jenkins"],
+    "grafana": ["grafana"],
+    "gitlab": ["gitlab"],
+    "jboss": ["jboss"],
+    "weblogic": ["weblogic"],
+}
+
+# Open services reported by nmap -> nuclei template tags.
+NUCLEI_SERVICE_TAGS = {
+    "ftp": ["ftp"],
+    "ssh": ["ssh"],
+    "mysql": ["mysql"],
+    "postgresql": ["postgres"],
+    "redis": ["redis"],
+    "mongodb": ["mongodb"],
+    "elasticsearch": ["elasticsearch"],
+}
+
 def run_command(command, output_file=None, timeout=900):
     """
     Execute a shell command and capture its output.
@@ -42,6 +113,58 @@ def run_command(command, output_file=None, timeout=900):
     except Exception as e:
         return f"[ERROR] {str(e)}"
 
+def stream_command(command, timeout=900, stderr_lines=20):
+    """
+    Execute a shell command and yield its stdout line by line.
+    Once the output is drained, raises subprocess.TimeoutExpired if the
+    command had to be killed, or subprocess.CalledProcessError (with the
+    last stderr_lines of stderr) if it exited non-zero, so callers keep
+    what was already parsed.
+    """
+    # stderr goes to a file so a chatty tool can never block on a full pipe
+    stderr_file = tempfile.TemporaryFile(mode="w+", encoding="utf-8", errors="replace")
+    process = subprocess.Popen(
+        command,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=stderr_file,
+        text=True,
+        bufsize=1,
+        start_new_session=True,
+    )
+    timed_out = threading.Event()
+
+    def _kill():
+        # Kill the whole process group, not only the shell wrapping the tool
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _on_timeout():
+        timed_out.set()
+        _kill()
+
+    timer = threading.Timer(timeout, _on_timeout)
+    timer.start()
+    try:
+        for line in process.stdout:
+            yield line
+    finally:
+        timer.cancel()
+        process.stdout.close()
+        if process.poll() is None:
+            _kill()
+        process.wait()
+        stderr_file.seek(0)
+        stderr_tail = "".join(stderr_file.readlines()[-stderr_lines:]).strip()
+        stderr_file.close()
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(command, timeout, stderr=stderr_tail)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr_tail)
+
 def ensure_http(url):
     if not url.startswith("http"):
         url = "https://" + url
@@ -103,46 +226,49 @@ def dirsearch_scan(url: str) -> Dict[str, Any]:
             "error": "wordlist missing",
         }
 
+    # One file per run: several workers may scan on the same machine at once
     output_file = os.path.join(
-        base_dir, f"dirsearch_results.txt"
+        tempfile.gettempdir(), f"dirsearch-{uuid.uuid4().hex}.txt"
     )
 
     cmd = (
         f"dirsearch -u {url} -w {wordlist} -e php,html,js,txt,asp,aspx -t 10 --include-status=200,401,403,500 --random-agent -o {output_file}"
     )
 
-    run_command(cmd)
-
     results: List[Dict[str, Any]] = []
 
-    if os.path.exists(output_file):
-        print('in if block')
-        print(output_file)
-        with open(output_file, "r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#') or line.startswith('Target:') or 'Dirsearch started' in line:
-                    continue
-
-                # Example of actual format:
-                # 200     4KB  https://example.com/admin
-                match = DIRSEARCH_LINE_RE.match(line)
-                if not match:
-                    continue
-
-                status = int(match.group(1))
-                # group(2) is the size (e.g., "4KB")
-                full_url = match.group(3)
-
-                # Extract just the path portion from the full URL
-                parsed_url = urlparse(full_url)
-                path = parsed_url.path
-
-                results.append({
-                    "status": status,
-                    "path": path,
-                    "url": full_url,
-                })
+    try:
+        run_command(cmd)
+
+        if os.path.exists(output_file):
+            with open(output_file, "r", encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#') or line.startswith('Target:') or 'Dirsearch started' in line:
+                        continue
+
+                    # Example of actual format:
+                    # 200     4KB  https://example.com/admin
+                    match = DIRSEARCH_LINE_RE.match(line)
+                    if not match:
+                        continue
+
+                    status = int(match.group(1))
+                    # group(2) is the size (e.g., "4KB")
+                    full_url = match.group(3)
+
+                    # Extract just the path portion from the full URL
+                    parsed_url = urlparse(full_url)
+                    path = parsed_url.path
+
+                    results.append({
+                        "status": status,
+                        "path": path,
+                        "url": full_url,
+                    })
+    finally:
+        if os.path.exists(output_file):
+            os.remove(output_file)
 
     metadata = {
         "script_name": "dirsearch",
@@ -156,17 +282,105 @@ def dirsearch_scan(url: str) -> Dict[str, Any]:
 
 
 # 3. Nuclei - Fast template-based vulnerability scanner
-def nuclei_scan(url: str) -> Dict[str, Any]:
-    """Run Nuclei with default templates against the target"""
-    # host = extract_host(url)
-    cmd = f"nuclei -u {url} -severity low,medium,high,critical -json "
-    print(f"[+] Starting Nuclei scan on {url}...")
-    output = run_command(cmd)
-    print(output)
-    metadata = {
-            'script_name': 'nuclei scan for vulnrability',
-            'script_output' : output
-        }
+def nuclei_tags_from_results(script_results: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    Pick nuclei template tags from the whatweb and nmap results of the same scan,
+    e.g. only WordPress templates on a WordPress host.
+    """
+    tags: List[str] = []
+    for result in script_results:
+        output = result.get("script_output") or ""
+        script_name = result.get("script_name", "")
+
+        if script_name.startswith("whatweb"):
+            # Drop the target URL itself so "wordpress.example.com" is not a hit
+            fingerprint = re.sub(r"https?://\S+", " ", output).lower()
+            for tech, tech_tags in NUCLEI_TECH_TAGS.items():
+                if re.search(r"\b" + re.escape(tech) + r"\b", fingerprint):
+                    tags.extend(tech_tags)
+
+        elif script_name.startswith("nmap"):
+            for line in output.splitlines():
+                match = NMAP_OPEN_PORT_RE.match(line.strip())
+                if match:
+                    tags.extend(NUCLEI_SERVICE_TAGS.get(match.group(3), []))
+
+    # Keep the first occurrence of every tag, in a stable order.
+    return list(dict.fromkeys(tags))
+
+
+def parse_nuclei_line(line: str) -> Optional[Dict[str, Any]]:
+    """Turn one line of nuclei JSONL output into a finding, or None for noise."""
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+
+    info = event.get("info") or {}
+    tags = info.get("tags") or []
+    if isinstance(tags, str):
+        # nuclei v2 reports tags as a comma separated string
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+
+    return {
+        "template_id": event.get("template-id"),
+        "name": info.get("name"),
+        "severity": info.get("severity", "unknown"),
+        "type": event.get("type"),
+        "host": event.get("host"),
+        "matched_at": event.get("matched-at"),
+        "matcher_name": event.get("matcher-name"),
+        "extracted_results": event.get("extracted-results") or [],
+        "tags": tags,
+    }
+
+
+def nuclei_scan(
+    url: str,
+    script_results: Optional[Iterable[Dict[str, Any]]] = None,
+    profile: str = DEFAULT_SCAN_PROFILE,
+) -> Dict[str, Any]:
+    """
+    Run Nuclei with templates selected from the fingerprint of the target.
+    Must run after whatweb/nmap; results are streamed from -jsonl output.
+    """
+    scan_profile = SCAN_PROFILES.get(profile, SCAN_PROFILES[DEFAULT_SCAN_PROFILE])
+    fingerprint_tags = nuclei_tags_from_results(script_results or [])
+    tags = list(dict.fromkeys(fingerprint_tags + scan_profile["nuclei_baseline_tags"]))
+
+    cmd = (
+        f"nuclei -u {url} -jsonl -silent -no-color -disable-update-check "
+        f"-severity {scan_profile['nuclei_severity']} "
+        f"-rl {scan_profile['nuclei_rate_limit']} -c {scan_profile['nuclei_concurrency']} "
+        f"-tags {','.join(tags)}"
+    )
+    logger.info(f"Starting Nuclei scan on {url} with tags {tags}")
+
+    results: List[Dict[str, Any]] = []
+    metadata: Dict[str, Any] = {
+        "script_name": "nuclei",
+        "target": url,
+        "profile": profile,
+        "tags": tags,
+        "fingerprint_tags": fingerprint_tags,
+    }
+    try:
+        for line in stream_command(cmd, timeout=scan_profile["nuclei_timeout"]):
+            finding = parse_nuclei_line(line)
+            if finding is not None:
+                results.append(finding)
+    except subprocess.TimeoutExpired:
+        metadata["error"] = "timed out after {} seconds".format(scan_profile["nuclei_timeout"])
+    except subprocess.CalledProcessError as exc:
+        metadata["error"] = f"exited with status {exc.returncode}"
+        if exc.stderr:
+            metadata["error"] += f": {exc.stderr}"
+
+    metadata["total_found"] = len(results)
+    metadata["results"] = results
     return metadata
 
 
@@ -212,9 +426,40 @@ def whatweb_scan(url: str) -> Dict[str, Any]:
 # List of all available scripts
 AVAILABLE_SCRIPTS = [
     nmap_scan,
-    # nuclei_scan,
     dirsearch_scan,
     nikto_scan,
     whatweb_scan
 ]
 
+# Scripts that need the results of AVAILABLE_SCRIPTS; each one is called as
+# script(url, script_results, profile) once the first stage has finished.
+FOLLOW_UP_SCRIPTS = [
+    nuclei_scan,
+]
+
+# Binary each script runs. Workers advertise the binaries they have installed
+# and only claim jobs whose profile needs nothing else.
+SCRIPT_BINARIES = {
+    nmap_scan: "nmap",
+    dirsearch_scan: "dirsearch",
+    nikto_scan: "nikto",
+    whatweb_scan: "whatweb",
+    nuclei_scan: "nuclei",
+}
+REQUIRED_BINARIES = list(SCRIPT_BINARIES.values())
+
+
+def profile_scripts(profile: str) -> Tuple[List[Callable], List[Callable]]:
+    """Return the first-stage and follow-up scripts a scan profile runs."""
+    tools = set(SCAN_PROFILES.get(profile, SCAN_PROFILES[DEFAULT_SCAN_PROFILE])["tools"])
+    return (
+        [script for script in AVAILABLE_SCRIPTS if SCRIPT_BINARIES[script] in tools],
+        [script for script in FOLLOW_UP_SCRIPTS if SCRIPT_BINARIES[script] in tools],
+    )
+
+
+def required_binaries(profile: str) -> List[str]:
+    """Return the binaries a worker needs to run a scan profile."""
+    first_stage, follow_up = profile_scripts(profile)
+    return [SCRIPT_BINARIES[script] for script in first_stage + follow_up]
+
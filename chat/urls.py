@@ -1,9 +1,18 @@
 from django.urls import path
 
-from .views import ChatCompletionView, ChatSessionDetailView
+from .views import (
+    ChatCompletionView,
+    ChatSessionDetailView,
+    ExportView,
+    ScanJobDetailView,
+    SearchView,
+)
 
 urlpatterns = [
     path("chat/", ChatCompletionView.as_view(), name="chat-completion"),
     path("chat/<uuid:session_id>/", ChatSessionDetailView.as_view(), name="chat-session-detail"),
+    path("jobs/<uuid:job_id>/", ScanJobDetailView.as_view(), name="scan-job-detail"),
+    path("search/", SearchView.as_view(), name="search"),
+    path("export/<str:export_format>/", ExportView.as_view(), name="export"),
 ]
 
@@ -0,0 +1,15 @@
+# gunicorn -c gunicorn.conf.py backend.wsgi
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Threads let one worker keep serving while other requests wait on scans or the LLM.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Inline scans run inside the request and can take as long as the tool timeouts.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "1200"))
+graceful_timeout = 30
+max_requests = 1000
+max_requests_jitter = 100
+accesslog = "-"